@@ -1,22 +1,44 @@
+import time
+_T_START = time.perf_counter()     # inizio degli import, per i tempi di avvio
 import sys
 import os
-import control as ctrl
+import argparse
+import asyncio
+import math
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
-from scipy import signal
-from PIL import Image, ImageTk
 import serial
 import serial.tools.list_ports
-import struct
 import threading
-from params_NVH import params_NVH
+from params_NVH import params_NVH, quarter_car_tf
+from serial_decoder import FrameParser
+from ring_buffer import RingBuffer
+from capture import RawRecorder, default_capture_path
+from nvh_ports import open_port
+from acquisition_process import ProcessAcquisition
+from nvh_asyncio import RigConnection, TkAsyncioBridge
+from acq_metrics import AcquisitionMetrics
+from read_policy import AdaptiveReadPolicy
+from plot_renderer import RENDERERS
+from plot_lod import EnvelopeLOD
+from plot_scheduler import PlotScheduler
+from history_store import TieredHistory
+from gap_tracker import GapTracker, session_gap_path
+from command_latency import CommandLatencyTracker
+from nvh_commands import CommandFrame, CommandQueue, TEST_SINE, TEST_SWEEP, TEST_QC, TEST_RENAULT
+from startup_timer import StartupTimer
+
+
+# Finestre del grafico live [s]; None = intera sessione
+PLOT_WINDOWS = {"10 s": 10, "1 min": 60, "10 min": 600, "1 h": 3600, "Sessione": None}
 
 
 class NVHApp:
-    def __init__(self, root):
+    def __init__(self, root, port=None, record_path=None, replay_speed=1.0, acq_mode='thread',
+                 metrics_path=None, max_latency=0.05, renderer='blit', plot_fps=30, startup=None, gaps_path=None):
+        # Tempi delle fasi di avvio, stampati quando il grafico è pronto
+        self.startup = startup or StartupTimer()
         self.style = ttk.Style()
         self.root = root
         self.root.title("Controllo Posizione")
@@ -27,11 +49,13 @@ class NVHApp:
         self.screen_height = root.winfo_screenheight()
 
         # Parametri NVH
-        try:
-            self.params = params_NVH()
-        except Exception as e:
-            print(f"Errore caricamento parametri NVH: {e}")
-            self.params = {'Tserial': 0.001, 'numz': [0, 0, 0, 0, 0], 'denz': [0, 0, 0, 0, 0]}
+        with self.startup.step("parametri"):
+            try:
+                # numz/denz di default calcolati al primo comando (default_tf)
+                self.params = params_NVH(quarter_car=False)
+            except Exception as e:
+                print(f"Errore caricamento parametri NVH: {e}")
+                self.params = {'Tserial': 0.001, 'numz': [0, 0, 0, 0, 0], 'denz': [0, 0, 0, 0, 0]}
 
         # Variabili per i controlli
         self.power_on = tk.BooleanVar()
@@ -72,24 +96,80 @@ class NVHApp:
         self.test_running = False
         self.readSerialOn = False
         self.read_thread = None
+        self.parser = None
+        # 'thread': lettura in un thread della GUI; 'process': processo figlio con shared memory;
+        # 'asyncio': lettura nell'event loop asyncio integrato nel mainloop di Tk
+        self.acq_mode = acq_mode
+        self.acquisition = None
+        self.async_bridge = None
+        self.rig = None
+        self.read_task = None
+
+        # Renderer del grafico live (vedi plot_renderer)
+        self.renderer_mode = renderer
+        self.renderer = None
+        # Inviluppo min/max per pixel tra buffer e linee (vedi plot_lod)
+        self.lod = None
+        self._snap = None
+        # Buffer e inviluppo avanzano insieme: una ricostruzione (resize) non perde blocchi
+        self._lod_lock = threading.Lock()
+        self._last_count = -1
+        # Al più un ridisegno in attesa, a plot_fps massimo
+        self.plot_scheduler = PlotScheduler(root, self.update_plot, fps=plot_fps)
+
+        # Comandi verso il banco (una write per gruppo di comandi)
+        self.commands = CommandQueue()
+
+        # Budget di latenza [s] per le letture seriali
+        self.max_latency = max_latency
+
+        # Diagnostica acquisizione (status bar e dump JSON opzionale)
+        self.metrics = AcquisitionMetrics()
+        self.metrics_path = metrics_path
+        # Gap map dei campioni persi, una per sessione di acquisizione
+        self.gaps = None
+        self.gaps_path = gaps_path      # None: gap map solo in status bar
+
+        # Registrazione opzionale dei byte grezzi ricevuti
+        self.record_path = record_path
+        self.recorder = None
+        if record_path and acq_mode != 'process':
+            self.recorder = RawRecorder(record_path)
+        if record_path:
+            print(f"Registrazione dati grezzi su {record_path}")
 
         # Buffer dati per plotting
         self.Tserial = self.params.get('Tserial', 0.001)
         self.Ntot = int(10 / self.Tserial)
         self.time_vect = np.arange(self.Ntot) * self.Tserial
-        self.pos_ref = np.zeros(self.Ntot)
-        self.pos_meas = np.zeros(self.Ntot)
-        self.st = np.zeros(self.Ntot)
+
+        # Latenza comando → cambio di stato st; i blocchi arrivano in ritardo fino al budget
+        # di lettura, più il polling del buffer condiviso (50 ms) in modalità processo
+        t_error = self.max_latency + (0.05 if acq_mode == 'process' else 0.0)
+        self.cmd_latency = CommandLatencyTracker(self.Tserial, t_error=t_error)
+        # Colonne: 0 pos_ref, 1 pos_meas, 2 st
+        self.data_buffer = RingBuffer(self.Ntot, n_channels=3)
+        # Storico della sessione oltre la finestra live (livelli min/max/media)
+        self.history = TieredHistory(self.Tserial)
+        self.plot_window = tk.StringVar(value="10 s")
+        self._plot_span = None
 
         # Stili personalizzati
         self.style.configure('headerFrame.TFrame', background='#ffe0b3')
         self.style.configure('headerLabel.TLabel', background='#ffe0b3', foreground='black')
 
         # Connessione seriale all'avvio
-        self.setup_serial_connection()
+        self.replay_speed = replay_speed
+        with self.startup.step("porta"):
+            if port:
+                self.open_serial_port(port)
+            else:
+                self.setup_serial_connection()
 
-        self.setup_ui()
-        self.setup_plot()
+        with self.startup.step("interfaccia"):
+            self.setup_ui()
+        # Figura del grafico live dopo che la finestra è stata disegnata
+        self.root.after_idle(self.setup_plot)
 
         # Aggiungi trace alle variabili per aggiornamenti automatici
         self.frequenza.trace_add('write', lambda *args: self.on_param_change())
@@ -97,16 +177,31 @@ class NVHApp:
         self.velocita.trace_add('write', lambda *args: self.on_param_change())
 
         # Avvia thread di lettura
-        self.readSerialOn = True
-    
-        self.read_thread = threading.Thread(target=self.read_serial_data, daemon=True)
-        self.read_thread.start()
+        self.start_reader()
+        self.root.after(1000, self.update_status)
 
         # Protocol per chiusura finestra
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
     """Funzioni per setuppare l'interfaccia grafica"""
 
+    def open_serial_port(self, port_name):
+        """Apre la porta indicata (vedi nvh_ports.open_port); in modalità 'process'
+        la porta viene aperta dal processo di acquisizione"""
+        if self.acq_mode == 'process':
+            self.acquisition = ProcessAcquisition(port_name, self.Ntot, n_channels=3,
+                                                  record_path=self.record_path,
+                                                  replay_speed=self.replay_speed,
+                                                  max_latency=self.max_latency,
+                                                  Tserial=self.Tserial, gaps_path=self.gaps_path)
+            # I comandi passano dal processo figlio, i dati dal buffer condiviso
+            self.serial_port = self.acquisition
+            self.data_buffer = self.acquisition.ring
+            return
+        # In modalità asyncio le letture non devono bloccare il loop
+        timeout = self.max_latency if self.acq_mode == 'asyncio' else 2
+        self.serial_port = open_port(port_name, timeout=timeout, replay_speed=self.replay_speed)
+
     def setup_serial_connection(self):
         """Mostra dialogo per selezione porta seriale"""
         ports = list(serial.tools.list_ports.comports())
@@ -136,14 +231,7 @@ class NVHApp:
                 port_idx = selection[0]
                 port_name = ports[port_idx].device
                 try:
-                    self.serial_port = serial.Serial(
-                        port=port_name,
-                        baudrate=12_000_000,
-                        bytesize=serial.EIGHTBITS,
-                        parity=serial.PARITY_NONE,
-                        stopbits=serial.STOPBITS_ONE,
-                        timeout=2
-                    )
+                    self.open_serial_port(port_name)
                     messagebox.showinfo("Successo", f"Connesso a {port_name}")
                     dialog.destroy()
                 except Exception as e:
@@ -201,8 +289,14 @@ class NVHApp:
 
         self.setup_controls()
 
+        # Status bar diagnostica acquisizione
+        self.status_var = tk.StringVar(value="Acquisizione: in attesa di dati")
+        status_bar = ttk.Label(self.root, textvariable=self.status_var, anchor="w", padding=(10, 2))
+        status_bar.grid(row=2, column=0, sticky="ew")
+
     def setup_header(self):
         try:
+            from PIL import Image, ImageTk
             self.original_image = Image.open(self.resource_path("img/logo_waya-removebg.png"))
             original_width, original_height = self.original_image.size
             self.new_height = 30
@@ -294,12 +388,13 @@ class NVHApp:
 
         self.tabs = {}
         
-        # Setup Sine Tab
-        self.setup_sine_tab()
-        self.setup_triangular_tab()
-        self.setup_sweep_tab()
-        self.setup_ISO_road_tab()
-        self.setup_timeHistory_tab()
+        # Le schede (e la figura Time History) si costruiscono alla prima selezione
+        self._tab_builders = {}
+        self.add_lazy_tab("Sine", "Sinusoide", self.setup_sine_tab)
+        self.add_lazy_tab("Triangular", "Triangolare", self.setup_triangular_tab)
+        self.add_lazy_tab("Sweep", "Sweep", self.setup_sweep_tab)
+        self.add_lazy_tab("ISO", "Profili ISO", self.setup_ISO_road_tab)
+        self.add_lazy_tab("timeHistory", "Time History", self.setup_timeHistory_tab)
 
         # Bottoni Start/Stop
         button_frame = ttk.Frame(test_frame)
@@ -315,11 +410,7 @@ class NVHApp:
         self.stop_button.config(state='disabled')
         self.pos_button.config(state='disabled')
 
-    def setup_sine_tab(self):
-        sine_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(sine_frame, text="Sinusoide")
-        self.tabs["Sine"] = sine_frame
-        
+    def setup_sine_tab(self, sine_frame):
         sine_frame.columnconfigure(0, weight=1)
         sine_frame.columnconfigure(1, weight=1)
         
@@ -451,11 +542,7 @@ class NVHApp:
             except (ValueError, ZeroDivisionError):
                 pass
 
-    def setup_triangular_tab(self):
-            trian_frame = ttk.Frame(self.notebook, padding="10")
-            self.notebook.add(trian_frame, text="Triangolare")
-            self.tabs["Triangular"] = trian_frame
-            
+    def setup_triangular_tab(self, trian_frame):
             trian_frame.columnconfigure(0, weight=1)
             trian_frame.columnconfigure(1, weight=1)
             
@@ -518,11 +605,7 @@ class NVHApp:
             self.tr_param1_entry.config(textvariable=self.frequenza)
             self.tr_param2_entry.config(textvariable=self.velocita)
 
-    def setup_sweep_tab(self):
-        sweep_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(sweep_frame, text="Sweep")
-        self.tabs["Sweep"] = sweep_frame
-        
+    def setup_sweep_tab(self, sweep_frame):
         sweep_frame.columnconfigure(0, weight=1)
         
         # Frame sinistra - Parametri
@@ -545,11 +628,7 @@ class NVHApp:
         param2_entry = ttk.Entry(params_frame, textvariable=self.sweep_amplitude, width=15)
         param2_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=5)
 
-    def setup_ISO_road_tab(self):
-        ISO_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(ISO_frame, text="Profili ISO")
-        self.tabs["ISO"] = ISO_frame
-        
+    def setup_ISO_road_tab(self, ISO_frame):
         ISO_frame.columnconfigure(0, weight=1)
         ISO_frame.columnconfigure(1, weight=1)
         
@@ -606,11 +685,7 @@ class NVHApp:
         ISO_param5_entry = ttk.Entry(ISO_params_frame, textvariable=self.QC_damping, width=15)
         ISO_param5_entry.grid(row=5, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=5)
 
-    def setup_timeHistory_tab(self):
-        time_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(time_frame, text="Time History")
-        self.tabs["timeHistory"] = time_frame
-        
+    def setup_timeHistory_tab(self, time_frame):
         time_frame.columnconfigure(0, weight=1)
         time_frame.rowconfigure(0, weight=1)
         
@@ -626,6 +701,9 @@ class NVHApp:
         plot_frame.columnconfigure(0, weight=1)
         plot_frame.rowconfigure(0, weight=1)
 
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+
         # Create figure with 1 subplot
         fig, ax = plt.subplots(1, 1, figsize=(8, 6))
         fig.tight_layout(pad=3.0)
@@ -652,13 +730,30 @@ class NVHApp:
         toolbar_frame = ttk.Frame(plot_frame)
         toolbar_frame.grid(row=1, column=0, sticky=(tk.W, tk.E))
 
-        from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
         toolbar = NavigationToolbar2Tk(canvas, toolbar_frame)
         toolbar.update()
 
+    def add_lazy_tab(self, key, text, builder):
+        """Aggiunge una scheda vuota; builder(frame) la riempie alla prima selezione"""
+        frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(frame, text=text)
+        self.tabs[key] = frame
+        self._tab_builders[str(frame)] = (key, builder)
+
+    def build_tab(self, tab_id):
+        pending = self._tab_builders.pop(str(tab_id), None)
+        if pending is None:
+            return
+        key, builder = pending
+        with self.startup.step(f"scheda {key}"):
+            builder(self.tabs[key])
+        if self.startup.reported:
+            print(f"Scheda {key} costruita in {1000 * self.startup.last:.0f} ms")
+
     def on_tab_change(self, event):
         """Gestisce il cambio di tab"""
         current_tab = self.notebook.select()  # Get the widget name of current tab
+        self.build_tab(current_tab)
         tab_text = self.notebook.tab(current_tab, "text")  # Get the tab text
         # print(f"Prev text: {self.wave_type.get()}")
         self.wave_type.set(tab_text)
@@ -669,13 +764,6 @@ class NVHApp:
         color = "green" if self.power_on.get() else "gray"
         self.led_canvas.create_oval(5, 5, 55, 55, fill=color, outline="black", width=2)
 
-    def newThread(self):
-        # Avvia thread di lettura
-        if not self.readSerialOn:
-            self.readSerialOn = True
-            self.read_thread = threading.Thread(target=self.read_serial_data, daemon=True)
-            self.read_thread.start()
-    
     def toggle_power(self):
         self.update_led()
         if self.power_on.get():
@@ -683,10 +771,7 @@ class NVHApp:
             self.send_power_command(1)
 
             # Avvia thread di lettura
-            if not self.readSerialOn:
-                self.readSerialOn = True
-                self.read_thread = threading.Thread(target=self.read_serial_data, daemon=True)
-                self.read_thread.start()
+            self.start_reader()
 
             self.start_button.config(state='normal')
             self.pos_button.config(state='normal')
@@ -695,16 +780,22 @@ class NVHApp:
         else:
             print("Sistema spento")
             self.send_power_command(0)
-            # Ferma thread
-            self.readSerialOn = False
-            if self.read_thread:
-                self.read_thread.join(timeout=2)
+            self.stop_reader()
 
             self.start_button.config(state='disabled')
             self.stop_button.config(state='disabled')
             self.pos_button.config(state='disabled')
 
     def setup_plot(self):
+        with self.startup.step("grafico"):
+            self._setup_plot()
+        print(self.startup.report())
+
+    def _setup_plot(self):
+        # matplotlib viene caricato qui, dopo che la finestra è stata disegnata
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+
         self.plot_frame.columnconfigure(0, weight=1)
         self.plot_frame.rowconfigure(0, weight=1)
 
@@ -738,24 +829,89 @@ class NVHApp:
         toolbar_frame = ttk.Frame(self.plot_frame)
         toolbar_frame.grid(row=1, column=0, sticky=(tk.W, tk.E))
 
-        from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
         self.toolbar = NavigationToolbar2Tk(self.canvas, toolbar_frame)
         self.toolbar.update()
 
+        # Finestra temporale del grafico: live (10 s) o storico della sessione
+        window_frame = ttk.Frame(self.plot_frame)
+        window_frame.grid(row=2, column=0, sticky=tk.W, padx=5)
+        ttk.Label(window_frame, text="Finestra:").grid(row=0, column=0, padx=(0, 5))
+        for i, label in enumerate(PLOT_WINDOWS):
+            ttk.Radiobutton(window_frame, text=label, value=label, variable=self.plot_window,
+                            command=self.plot_scheduler.request).grid(row=0, column=i + 1, padx=3)
+
+        self.renderer = RENDERERS[self.renderer_mode](self.canvas, self.ax1,
+                                                      (self.line_ref, self.line_meas),
+                                                      self.line_state)
+        self.setup_lod()
+        self.canvas.mpl_connect('resize_event', lambda event: self.setup_lod())
+
+    def setup_lod(self):
+        """Un intervallo min/max per pixel dell'asse; ricostruito dalla finestra a piena risoluzione"""
+        if self.renderer is None:
+            return
+        n_bins = max(int(self.ax1.bbox.width), 100)
+        if n_bins >= self.Ntot:
+            self.lod = None
+            return
+        lod = EnvelopeLOD(self.Ntot, n_channels=3, n_bins=n_bins, Tserial=self.Tserial)
+        with self._lod_lock:
+            data, count = self.snapshot()
+            if self.acquisition and self._last_count >= 0:
+                # Modalità processo: i campioni oltre _last_count li aggiunge poll_acquisition
+                data = data[:len(data) - min(count - self._last_count, len(data))]
+            lod.append(data)
+            self.lod = lod
+
+    def snapshot(self):
+        """Copia coerente di tutti i canali (pos_ref, pos_meas, st) e numero di campioni
+
+        Non blocca il thread/processo di acquisizione (seqlock del buffer);
+        il buffer di copia viene riusato, quindi vale fino alla chiamata successiva.
+        """
+        self._snap, count = self.data_buffer.snapshot(out=self._snap)
+        return self._snap, count
+
+    def plot_span(self):
+        """Durata [s] della finestra selezionata; per la sessione arrotondata a potenze di 2"""
+        span = PLOT_WINDOWS[self.plot_window.get()]
+        if span is None:
+            span = 2 ** math.ceil(math.log2(max(self.history.duration, 10)))
+        return span
+
+    def push_samples(self, data):
+        """Accoda i campioni decodificati al buffer, allo storico e all'inviluppo del grafico"""
+        with self._lod_lock:
+            self.data_buffer.append(data)
+            lod = self.lod
+            if lod is not None:
+                lod.append(data)
+        self.history.append(data)
+
     def update_plot(self):
         """Aggiorna il grafico con i dati correnti"""
+        if self.renderer is None:
+            return      # figura non ancora costruita
         try:
-            self.line_ref.set_data(self.time_vect, self.pos_ref)
-            self.line_meas.set_data(self.time_vect, self.pos_meas)
-            self.line_state.set_data(self.time_vect, self.st)
-            
-            # Auto-scale y-axis per le posizioni
-            if np.any(self.pos_ref != 0) or np.any(self.pos_meas != 0):
-                y_min = min(np.min(self.pos_ref), np.min(self.pos_meas)) - 2
-                y_max = max(np.max(self.pos_ref), np.max(self.pos_meas)) + 2
-                self.ax1.set_ylim(y_min, y_max)
-            
-            self.canvas.draw_idle()
+            span = self.plot_span()
+            if span != self._plot_span:
+                # Cambio di finestra: nuovi limiti x e ridisegno completo
+                self._plot_span = span
+                self.renderer.set_xlim(0, span)
+            if span > self.Ntot * self.Tserial:
+                # Zoom out: livello dello storico con circa un punto per pixel
+                t_end = self.history.duration
+                x, y = self.history.envelope(t_end - span, t_end, max_points=int(self.ax1.bbox.width))
+                if len(x):
+                    self.renderer.update(x, y)
+                return
+
+            # Il renderer aggiorna linee e scala y (pos_ref, pos_meas, st)
+            lod = self.lod
+            if lod is not None:
+                self.renderer.update(*lod.envelope())
+            else:
+                self.renderer.update(self.time_vect, self.snapshot()[0])
         except Exception as e:
             print(f"Errore aggiornamento grafico: {e}")
 
@@ -778,98 +934,156 @@ class NVHApp:
             messagebox.showerror("Errore", "Inserire valori numerici validi per i parametri QC")
             return
 
-        # Variabile s
-        s = ctrl.TransferFunction.s
-
-        # Funzione di trasferimento continua
-        Gs = -s**2*(ku*ms) / ( s**4*ms*mu
-                            + s**3*cs*(ms+mu)
-                            + s**2*(ku*ms + ks*(ms+mu))
-                            + s*ku*cs
-                            + ks*ku )
-
-        # Discretizzazione con Tustin
-        Gz = ctrl.sample_system(Gs, Tref, method='tustin')
-
-        # Estrazione numerator & denominator
-        numz = np.squeeze(Gz.num[0][0])
-        denz = np.squeeze(Gz.den[0][0])
-
-        self.numz = numz
-        self.denz = denz
+        self.numz, self.denz = quarter_car_tf(Tref, ms, mu, ks, ku, cs)
         # print(f"updated transfer function\n numz: {self.numz}\n, denz: {self.denz}")
 
     """Logiche di gestione test e seriale"""
 
+    def start_reader(self):
+        """Avvia la lettura: thread locale oppure polling del buffer condiviso"""
+        if self.readSerialOn:
+            return
+        self.readSerialOn = True
+        self.plot_scheduler.start()
+        if self.gaps is None:
+            self.gaps = GapTracker(self.Tserial)
+        else:
+            # Nuovo parser a ogni power on: la pausa non conta come perdita
+            self.gaps.reset()
+        if self.acquisition:
+            self._last_count = -1
+            self.root.after(50, self.poll_acquisition)
+            return
+        if self.acq_mode == 'asyncio':
+            if self.async_bridge is None:
+                self.async_bridge = TkAsyncioBridge(self.root)
+            self.read_task = self.async_bridge.spawn(self.read_serial_async())
+            return
+        self.read_thread = threading.Thread(target=self.read_serial_data, daemon=True)
+        self.read_thread.start()
+
+    def stop_reader(self):
+        """Ferma la lettura e attende la fine del thread o della coroutine, così una
+        nuova start_reader() non si sovrappone alla sessione precedente"""
+        self.readSerialOn = False
+        if self.read_thread:
+            self.read_thread.join(timeout=2)
+        if self.async_bridge:
+            self.async_bridge.cancel(self.read_task)
+        self.read_task = None
+
+    def update_status(self):
+        """Aggiorna la status bar con le metriche dell'ultimo secondo"""
+        if self.acquisition:
+            # Modalità processo: contatori e tempi per stadio pubblicati dal figlio
+            st = self.acquisition.ring.parser_stats()
+            self.metrics.update_from_stats(st['bytes_in'], st['frames'], st['bytes_discarded'],
+                                           st['resyncs'], samples=self.data_buffer.count,
+                                           chunks=st['chunks'], stage_time=st['stage_time'],
+                                           source=self.acquisition)
+        snap = self.metrics.snapshot()
+        text = self.metrics.status_text(snap)
+        if self.acquisition:
+            text += f" | gap {st['gap_events']} ({st['samples_lost']} campioni)"
+        elif self.gaps:
+            text += f" | {self.gaps.status_text()}"
+        if self.cmd_latency.last:
+            text += f" | {self.cmd_latency.status_text()}"
+        self.plot_scheduler.measure_fps()
+        text += f" | {self.plot_scheduler.status_text()}"
+        self.status_var.set(text)
+        if self.metrics_path:
+            snap['command_latency'] = self.cmd_latency.summary()
+            snap['plot'] = {'fps': self.plot_scheduler.fps, 'frames': self.plot_scheduler.frames,
+                            'requests': self.plot_scheduler.requests,
+                            'skipped': self.plot_scheduler.skipped}
+            try:
+                self.metrics.dump_json(self.metrics_path, snap)
+            except OSError as e:
+                print(f"Errore scrittura metriche: {e}")
+        self.root.after(1000, self.update_status)
+
+    def poll_acquisition(self):
+        """Modalità processo: ridisegna quando il figlio ha scritto nuovi campioni"""
+        if not self.readSerialOn or not self.acquisition:
+            return
+        count = self.data_buffer.count
+        if count != self._last_count:
+            if self._last_count >= 0:
+                data, count = self.snapshot()
+                n_new = min(count - self._last_count, self.data_buffer.length)
+                new = data[-n_new:]
+                self.cmd_latency.observe(new[:, 2])
+                if self.lod is not None:
+                    self.lod.append(new)
+                self.history.append(new)
+            else:
+                # Primo polling: lo storico recupera quanto il figlio ha scritto prima
+                # (l'inizio della sessione), senza ripetere campioni di sessioni precedenti
+                data, count = self.snapshot()
+                n_missing = min(count - self.history.count, self.data_buffer.length)
+                if n_missing > 0:
+                    self.history.append(data[-n_missing:])
+                self._last_count = count
+                self.setup_lod()
+            self._last_count = count
+            with self.metrics.stage('plot_schedule'):
+                self.plot_scheduler.request()
+        self.root.after(50, self.poll_acquisition)
+
     def read_serial_data(self):
         """Thread per lettura continua dati seriali"""
+        if not self.serial_port or not self.serial_port.is_open:
+            # Nessuna porta (dialogo annullato o apertura fallita): niente da leggere
+            self.readSerialOn = False
+            return
         Nd = int(1 * 6 * 1001)
-        
+        # Il parser conserva i frame parziali tra una lettura e l'altra
+        parser = FrameParser(Nd * 2)
+        self.parser = parser
+        if self.recorder:
+            parser.tap = self.recorder.record
+        resyncs_seen = 0
+        resync_latency_seen = 0.0
+        # Letture dimensionate su in_waiting e sul budget di latenza
+        policy = AdaptiveReadPolicy(max_latency=self.max_latency, max_chunk=Nd * 2)
+        policy.apply(self.serial_port)
+        t_last_data = time.perf_counter()
+
         while self.readSerialOn and self.serial_port and self.serial_port.is_open:
         # while self.serial_port and self.serial_port.is_open:
             # print("Provo a leggere da seriale...")
             try:
-                rawdata = self.serial_port.read(Nd * 2)
-                # print(f"Bytes letti: {len(rawdata)}")
-                if len(rawdata) < 4:
-                    print("Dati insufficienti ricevuti, rawdata.length < 4")
+                # Lettura nel buffer del parser: restituisce solo i campioni di frame completi
+                self.metrics.observe_port(self.serial_port)
+                data_float = parser.read(self.serial_port, policy.next_size(self.metrics.in_waiting))
+                policy.observe(parser.nread)
+                self.gaps.update(parser)
+                self.metrics.update_from_parser(parser, 0 if data_float is None else len(data_float))
+                if parser.nread < 4:
+                    if time.perf_counter() - t_last_data > 2:
+                        print("Dati insufficienti ricevuti, rawdata.length < 4")
+                        t_last_data = time.perf_counter()
                     continue
-
-                rawdata_uint16 = list(struct.unpack('<' + 'H' * (len(rawdata) // 2), rawdata))
-
-                # Trova header
-                header = [17733, 21331]
-                self.headPos = [i for i in range(len(rawdata_uint16) - 1) if rawdata_uint16[i:i + 2] == header]
-
-                # print(f"pos number: {len(self.headPos)}")
-                # print(f"Rawdata: {rawdata_uint16[:20]}")
-                
-                for idx in reversed(self.headPos):
-                    del rawdata_uint16[idx:idx + 2]
-
-                if not self.headPos:
-                    # Avvia thread di lettura
-                    print(f"No pos found")
-                    # Ferma thread
-                    self.readSerialOn = False
-                    print(f"Stopping read thread")
-                    # if self.read_thread:
-                    #     self.read_thread.join(timeout=2)
-                    #     print(f"Thread joined and closed")
-
-                    self.root.after(1000, self.newThread)
-                    print(f"Scheduled thread restarting after 1000ms")
-                    
-                    
-
-                # Riallinea i dati a multipli di 3
-                istart = (self.headPos[0] % 3)
-                rawdata_aligned = rawdata_uint16[istart:]
-                iend = (len(rawdata_aligned) // 3) * 3
-                rawdata_aligned = rawdata_aligned[:iend]
-
-                # print(f"Rawdata aligned: {rawdata_aligned[:20]}")
-
-                if len(rawdata_aligned) < 3:
-                    print(f"Rawdata aligned too short, rawdata_aligned.length < 3")
+                t_last_data = time.perf_counter()
+
+                # Header perso: il parser continua a cercarlo in avanti senza fermare il thread
+                if parser.resyncing and parser.resyncs != resyncs_seen:
+                    resyncs_seen = parser.resyncs
+                    print(f"Header perso, risincronizzazione in corso ({resyncs_seen} eventi)")
+                elif resync_latency_seen != parser.resync_latency_last:
+                    resync_latency_seen = parser.resync_latency_last
+                    print(f"Risincronizzato in {1000 * resync_latency_seen:.1f} ms")
+
+                if data_float is None:
+                    # Nessun frame completato in questa lettura
                     continue
 
-                # Converti fixed-point signed (1,16,9)
-                data = np.array(rawdata_aligned, dtype=np.uint16).reshape(-1, 3)
-                data_int16 = data.view(dtype=np.int16)
-                scale = 2 ** 9
-                data_float = data_int16.astype(np.float32) / scale
-                # print(f"Data: {data[:5, :]}")
-                # print(f"Data float: {data_float[:5, :]}")
+                self.cmd_latency.observe(data_float[:, 2])
 
                 # Aggiorna buffer circolari
-                L = len(data_float)
-                self.pos_ref = np.roll(self.pos_ref, -L)
-                self.pos_meas = np.roll(self.pos_meas, -L)
-                self.st = np.roll(self.st, -L)
-                self.pos_ref[-L:] = data_float[:, 0]
-                self.pos_meas[-L:] = data_float[:, 1]
-                self.st[-L:] = data_float[:, 2]
+                with self.metrics.stage('append'):
+                    self.push_samples(data_float)
 
                 # # Aggiorna scale
                 # if L > 0:
@@ -879,13 +1093,74 @@ class NVHApp:
                 # print(f"Lettura seriale: {L} campioni ricevuti")
 
                 # Aggiorna grafico
-                if self.headPos:
-                    self.root.after(0, self.update_plot)
+                with self.metrics.stage('plot_schedule'):
+                    self.plot_scheduler.request()
 
             except Exception as e:
                 print(f"Errore lettura seriale: {e}")
                 continue
 
+    async def read_serial_async(self):
+        """Modalità asyncio: consuma i blocchi decodificati nel thread della GUI"""
+        if not self.serial_port or not self.serial_port.is_open:
+            self.readSerialOn = False
+            return
+        rig = self.rig = RigConnection(self.serial_port, Tserial=self.Tserial)
+        self.parser = rig.parser
+        if self.recorder:
+            self.parser.tap = self.recorder.record
+        rig.gaps = self.gaps
+        rig.start()
+        try:
+            async for block in rig.frames():
+                if not self.readSerialOn:
+                    break
+                self.metrics.update_from_parser(self.parser, len(block))
+                self.metrics.observe_port(self.serial_port)
+                self.cmd_latency.observe(block[:, 2])
+                with self.metrics.stage('append'):
+                    self.push_samples(block)
+                with self.metrics.stage('plot_schedule'):
+                    self.plot_scheduler.request()
+        finally:
+            rig.close(close_port=False)
+            # Solo se nel frattempo non è partita un'altra sessione
+            if self.rig is rig:
+                self.rig = None
+                self.readSerialOn = False
+
+    def default_tf(self):
+        """numz/denz del quarter car di default, calcolati alla prima richiesta"""
+        if 'numz' not in self.params and 'quarter_car' in self.params:
+            self.params['numz'], self.params['denz'] = quarter_car_tf(self.params['Tref'],
+                                                                      **self.params['quarter_car'])
+        return self.params.get('numz', [0, 0, 0]), self.params.get('denz', [0, 0, 0, 0, 0])
+
+    def base_command(self, **fields):
+        """Comando con la funzione di trasferimento di default (power, posizionamento, stop)"""
+        numz, denz = self.default_tf()
+        return CommandFrame(pos_en=1, Gr_sel=2, numz=numz, denz=denz, **fields)
+
+    def send_command(self, *frames):
+        """Invia uno o più comandi con una sola write"""
+        if self.rig is not None and self.async_bridge:
+            # Modalità asyncio: invio dalla connessione attiva, con conferma dal banco
+            self.async_bridge.spawn(self.send_confirmed(self.rig, frames))
+            return
+        self.commands.send(*frames, port=self.serial_port)
+        self.cmd_latency.sent(frames[-1])
+
+    async def send_confirmed(self, rig, frames, timeout=2.0):
+        """Invia i comandi e attende la transizione di st allo stato atteso dall'ultimo"""
+        last = frames[-1]
+        self.cmd_latency.sent(last)
+        try:
+            await rig.send(list(frames), expect_states=last.expected_state(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Comando {last.kind}: nessun cambio di stato del banco entro {timeout:g} s")
+        except (OSError, ValueError) as e:
+            print(f"Errore invio comando {last.kind}: {e}")
+
     def send_power_command(self, power_state):
         """Invia comando di accensione/spegnimento"""
         if not self.serial_port or not self.serial_port.is_open:
@@ -897,25 +1172,7 @@ class NVHApp:
         except ValueError:
             pos_init = 0
 
-        # Costruisci messaggio
-        header_bits = f"{0:01b}{power_state:01b}{1:01b}{0:01b}{0:01b}{0:02b}{2:02b}"
-        msghead = int(header_bits, 2)
-
-        msg = [
-            np.float32(msghead),
-            np.float32(pos_init),
-            np.float32(0), np.float32(0), np.float32(0), np.float32(0),
-            np.float32(self.params.get('numz', [0, 0, 0])[0] * 1000),
-            np.float32(self.params.get('numz', [0, 0, 0])[2] * 1000),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[1]),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[2]),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[3]),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[4]),
-            np.float32(0), np.float32(0), np.float32(0)
-        ]
-
-        tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-        self.serial_port.write(tx_bytes)
+        self.send_command(self.base_command(pow_en=power_state, pos_init_mm=pos_init))
         print(f"Comando power {'ON' if power_state else 'OFF'} inviato")
 
     def posizionamento(self):
@@ -930,24 +1187,7 @@ class NVHApp:
                 return
 
             # Invia comando di posizionamento
-            header_bits = f"{0:01b}{1:01b}{1:01b}{0:01b}{0:01b}{0:02b}{2:02b}"
-            msghead = int(header_bits, 2)
-
-            msg = [
-                np.float32(msghead),
-                np.float32(pos),
-                np.float32(0), np.float32(0), np.float32(0), np.float32(0),
-                np.float32(self.params.get('numz', [0, 0, 0])[0] * 1000),
-                np.float32(self.params.get('numz', [0, 0, 0])[2] * 1000),
-                np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[1]),
-                np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[2]),
-                np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[3]),
-                np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[4]),
-                np.float32(0), np.float32(0), np.float32(0)
-            ]
-
-            tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-            self.serial_port.write(tx_bytes)
+            self.send_command(self.base_command(pow_en=1, pos_init_mm=pos))
             
             # self.scale_target.set(pos)
             print(f"Posizionamento a: {pos} mm")
@@ -984,59 +1224,22 @@ class NVHApp:
         
         numz = self.numz
         denz = self.denz
+        # Campi comuni ai test: power, posizionamento e start attivi
+        test_cmd = CommandFrame(pow_en=1, pos_en=1, test_start=1, pos_init_mm=pos_init,
+                                amplitude_mm=amplitude, vcar_kmh=vcar, freq_Hz=freq,
+                                rate_Hz_s=1, numz=numz, denz=denz,
+                                fend_Hz=10, aend_mm=amplitude)
 
         if  self.wave_type.get() == "Sinusoide":
             # Costruisci messaggio per test Sine
-            test_sel = 0  # Sine
-            wv_type = 0  # 0 Sine, 1 triangular
-            header_bits = f"{wv_type:01b}{1:01b}{1:01b}{1:01b}{0:01b}{test_sel:02b}{0:02b}"
-            msghead = int(header_bits, 2)
-            msg = [
-                np.float32(msghead),
-                np.float32(pos_init),
-                np.float32(amplitude),
-                np.float32(vcar),
-                np.float32(freq),
-                np.float32(1),   # rate_Hz_s (non usato per sine)
-                np.float32(numz[0] * 1000),
-                np.float32(numz[2] * 1000),
-                np.float32(denz[1]),
-                np.float32(denz[2]),
-                np.float32(denz[3]),
-                np.float32(denz[4]),
-                np.float32(10),  # fend_Hz
-                np.float32(amplitude),  # aend_mm
-                np.float32(0)
-            ]
-            tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-            self.serial_port.write(tx_bytes)
+            # rate_Hz_s, fend_Hz e aend_mm non usati per sine
+            self.send_command(test_cmd.replace(wv_type=0, test_sel=TEST_SINE))
             print(f"Test Sine avviato: freq={freq} Hz, amp={amplitude} mm")
         
         elif  self.wave_type.get() == "Triangolare":
             # Costruisci messaggio per test Triangolare
-            test_sel = 0  # Sine
-            wv_type = 1   # 0 Sine, 1 Triangular
-            header_bits = f"{wv_type:01b}{1:01b}{1:01b}{1:01b}{0:01b}{test_sel:02b}{0:02b}"
-            msghead = int(header_bits, 2)
-            msg = [
-                np.float32(msghead),
-                np.float32(pos_init),
-                np.float32(amplitude),
-                np.float32(vcar),
-                np.float32(freq),
-                np.float32(1),  # rate_Hz_s (non usato per trinagular)
-                np.float32(numz[0] * 1000),
-                np.float32(numz[2] * 1000),
-                np.float32(denz[1]),
-                np.float32(denz[2]),
-                np.float32(denz[3]),
-                np.float32(denz[4]),
-                np.float32(10),  # fend_Hz
-                np.float32(amplitude),  # aend_mm
-                np.float32(0)
-            ]
-            tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-            self.serial_port.write(tx_bytes)
+            # Test Sine con forma d'onda triangolare
+            self.send_command(test_cmd.replace(wv_type=1, test_sel=TEST_SINE))
             print(f"Test Triangolare avviato: freq={freq} Hz, amp={amplitude} mm")
 
         elif self.wave_type.get() == "Sweep":
@@ -1044,36 +1247,16 @@ class NVHApp:
             fInit_Hz = float(self.sweep_init_freq.get())
             fEnd_Hz = float(self.sweep_final_freq.get())
             amplitude = float(self.sweep_amplitude.get())
-            wv_type = 0
-            test_sel = 1   # Sweep
             rate_Hz_s = 1  # Rateo di variazione frequenza [Hz/s] (0.1/10 Hz/s)
-            header_bits = f"{wv_type:01b}{1:01b}{1:01b}{1:01b}{0:01b}{test_sel:02b}{0:02b}"
-            msghead = int(header_bits, 2)
-            msg = [
-                np.float32(msghead),
-                np.float32(pos_init),
-                np.float32(amplitude),
-                np.float32(vcar),
-                np.float32(fInit_Hz),      # Frequenza iniziale
-                np.float32(rate_Hz_s),     # Rateo di variazione frequenza [Hz/s]
-                np.float32(numz[0] * 1000),
-                np.float32(numz[2] * 1000),
-                np.float32(denz[1]),
-                np.float32(denz[2]),
-                np.float32(denz[3]),
-                np.float32(denz[4]),
-                np.float32(fEnd_Hz),       # Frequenza finale
-                np.float32(amplitude),     # Ampiezza finale (se usata)
-                np.float32(0)
-            ]
-            tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-            self.serial_port.write(tx_bytes)
+            self.send_command(test_cmd.replace(test_sel=TEST_SWEEP, amplitude_mm=amplitude,
+                                               freq_Hz=fInit_Hz, rate_Hz_s=rate_Hz_s,
+                                               fend_Hz=fEnd_Hz, aend_mm=amplitude))
             print(f"Test Sweep avviato: f_start={fInit_Hz} Hz → f_end={fEnd_Hz} Hz, amp={amplitude} mm")
 
         elif self.wave_type.get() == "Profili ISO":
 
             # Test 2 - Quarter Car / Random
-            test_sel = 2  # Quarter car / Random
+            test_sel = TEST_QC  # Quarter car / Random
             vcar = float(self.QC_car_velocity.get())
 
             # Aggiorna self.numz e self.denz usando la funzione che calcola la TF del quarter-car
@@ -1089,61 +1272,21 @@ class NVHApp:
             # Preleva numz/denz calcolate; fallback su params se non disponibili
             numz = self.numz
             denz = self.denz
+            if numz is None or len(numz) < 5 or denz is None or len(denz) < 5:
+                default_numz, default_denz = self.default_tf()
             if numz is None or len(numz) < 5:
-                numz = self.params.get('numz', [1, 1, 1, 1, 1])
+                numz = default_numz
             if denz is None or len(denz) < 5:
-                denz = self.params.get('denz', [1, 1, 1, 1, 1])
-
-            header_bits = f"{0:01b}{1:01b}{1:01b}{1:01b}{0:01b}{test_sel:02b}{gr_sel_val:02b}"
-            msghead = int(header_bits, 2)
-
-            msg = [
-                np.float32(msghead),
-                np.float32(pos_init),
-                np.float32(amplitude),
-                np.float32(vcar),
-                np.float32(freq),
-                np.float32(1),  # rate_Hz_s (non usato per quarter car)
-                np.float32(numz[0] * 1000),
-                np.float32(numz[2] * 1000),
-                np.float32(denz[1]),
-                np.float32(denz[2]),
-                np.float32(denz[3]),
-                np.float32(denz[4]),
-                np.float32(10),  # fend_Hz (placeholder)
-                np.float32(amplitude),  # aend_mm (placeholder)
-                np.float32(0)
-            ]
-
-            tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-            self.serial_port.write(tx_bytes)
+                denz = default_denz
+
+            self.send_command(test_cmd.replace(test_sel=test_sel, Gr_sel=gr_sel_val,
+                                               vcar_kmh=vcar, numz=numz, denz=denz))
             print(f"Test Random/Quarter Car avviato: strada={gr_sel_val}, vcar={vcar} km/h")
 
         elif self.wave_type.get() == "Time History":
             # Test 3 - Renault / Time History
             print("Time history test")
-            test_sel = 3
-            header_bits = f"{0:01b}{1:01b}{1:01b}{1:01b}{0:01b}{test_sel:02b}{0:02b}"
-            msghead = int(header_bits, 2)
-            msg = [
-                np.float32(msghead),
-                np.float32(pos_init),
-                np.float32(amplitude),
-                np.float32(vcar),
-                np.float32(freq),
-                np.float32(1),
-                np.float32(numz[0] * 1000),
-                np.float32(numz[2] * 1000),
-                np.float32(denz[1]),
-                np.float32(denz[2]),
-                np.float32(denz[3]),
-                np.float32(denz[4]),
-                np.float32(freq),
-                np.float32(amplitude),
-                np.float32(0)
-            ]
-            tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-            self.serial_port.write(tx_bytes)
+            self.send_command(test_cmd.replace(test_sel=TEST_RENAULT, fend_Hz=freq))
             print(f"Test Time History avviato: vcar={vcar} km/h")
 
         #Avvia thread di lettura
@@ -1158,29 +1301,9 @@ class NVHApp:
         if not self.serial_port or not self.serial_port.is_open:
             return
         
-        # Invia comando di posizionamento
-        header_bits = f"{0:01b}{1:01b}{1:01b}{0:01b}{0:01b}{0:02b}{2:02b}"
-        msghead = int(header_bits, 2)
-
-        # Invia comando di stop
-        header_bits = f"{0:01b}{1:01b}{1:01b}{0:01b}{1:01b}{0:02b}{2:02b}"
-        msghead = int(header_bits, 2)
-
-        msg = [
-            np.float32(msghead),
-            np.float32(float(self.posizione_iniziale.get())),
-            np.float32(0), np.float32(0), np.float32(0), np.float32(0),
-            np.float32(self.params.get('numz', [0, 0, 0])[0] * 1000),
-            np.float32(self.params.get('numz', [0, 0, 0])[2] * 1000),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[1]),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[2]),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[3]),
-            np.float32(self.params.get('denz', [0, 0, 0, 0, 0])[4]),
-            np.float32(0), np.float32(0), np.float32(0)
-        ]
-
-        tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-        self.serial_port.write(tx_bytes)
+        # Invia comando di stop (il banco torna in posizionamento)
+        self.send_command(self.base_command(pow_en=1, test_stop=1,
+                                            pos_init_mm=float(self.posizione_iniziale.get())))
 
         # # Ferma thread
         self.test_running = False
@@ -1195,9 +1318,26 @@ class NVHApp:
     def on_closing(self):
         """Gestisce la chiusura della finestra"""
         self.readSerialOn = False
+        self.plot_scheduler.stop()
         
         if self.read_thread and self.read_thread.is_alive():
             self.read_thread.join(timeout=2)
+
+        if self.async_bridge:
+            self.async_bridge.close()
+
+        if self.cmd_latency.latencies:
+            print("Latenza comando → stato:\n" + self.cmd_latency.report())
+
+        if self.recorder:
+            self.recorder.close()
+            print(f"Registrazione chiusa: {self.recorder.bytes_written} byte, "
+                  f"{self.recorder.dropped_chunks} blocchi persi")
+
+        # Gap map della sessione, se richiesta (in modalità processo la salva il figlio)
+        if self.gaps_path and not self.acquisition and self.gaps and self.gaps.received:
+            self.gaps.save(self.gaps_path)
+            print(f"Gap map salvata in {self.gaps_path}: {self.gaps.status_text()}")
         
         if self.serial_port and self.serial_port.is_open:
             try:
@@ -1216,11 +1356,57 @@ class NVHApp:
         return os.path.join(base_path, relative_path)
 
 
+def positive_float(text):
+    """Tipo argparse: numero finito maggiore di zero"""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"numero non valido: {text!r}")
+    if not math.isfinite(value) or value <= 0:
+        raise argparse.ArgumentTypeError(f"deve essere maggiore di zero: {text}")
+    return value
+
+
 # Avvio applicazione
 def main():
+    startup = StartupTimer(t0=_T_START)
+    startup.mark("import", _T_START)
+    parser = argparse.ArgumentParser(description="Banco prova NVH")
+    parser.add_argument('--port', help="porta seriale (es. COM8, /dev/pts/3, 'sim' per il simulatore, "
+                                       "'replay:FILE' per una cattura); se omessa viene mostrato il dialogo")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="velocità di replay (1 tempo reale, 50 = 50x, 0 = massima)")
+    parser.add_argument('--record', nargs='?', const='', metavar='FILE',
+                        help="registra i byte grezzi ricevuti (senza FILE: captures/nvh_<data>.nvhcap)")
+    parser.add_argument('--gaps', nargs='?', const='', metavar='FILE',
+                        help="salva la gap map dei campioni persi (senza FILE: accanto alla "
+                             "registrazione o captures/nvh_<data>.gaps.json); con --record è automatica")
+    parser.add_argument('--acq', choices=('thread', 'process', 'asyncio'), default='thread',
+                        help="acquisizione in un thread della GUI (default), in un processo separato "
+                             "o nell'event loop asyncio integrato in Tk")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="salva ogni secondo le metriche di acquisizione in JSON")
+    parser.add_argument('--max-latency', type=float, default=50, metavar='MS',
+                        help="ritardo massimo [ms] tra arrivo dei dati e decodifica (default 50)")
+    parser.add_argument('--renderer', choices=tuple(RENDERERS), default='blit',
+                        help="grafico live: blit (solo linee su sfondo in cache) o draw_idle (ridisegno completo)")
+    parser.add_argument('--fps', type=positive_float, default=30,
+                        help="frequenza massima di ridisegno del grafico live (default 30)")
+    args = parser.parse_args()
+    record_path = None
+    if args.record is not None:
+        record_path = args.record or default_capture_path()
+    # Gap map: sempre accanto a una registrazione, altrimenti solo con --gaps
+    gaps_path = None
+    if record_path or args.gaps is not None:
+        gaps_path = args.gaps or session_gap_path(record_path)
+
     root = tk.Tk()
     root.option_add("*Font", "Inter 12")
-    app = NVHApp(root)
+    app = NVHApp(root, port=args.port, record_path=record_path, replay_speed=args.speed,
+                 acq_mode=args.acq, metrics_path=args.metrics, renderer=args.renderer,
+                 plot_fps=args.fps, startup=startup, gaps_path=gaps_path,
+                 max_latency=args.max_latency / 1000)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from serial_decoder import FRAME_ALIGN
+
+STAGES = ('read', 'decode', 'append', 'plot_schedule')
+
+
+class AcquisitionMetrics:
+    """Metriche del percorso di acquisizione
+
+    Il thread di lettura aggiorna contatori e tempi per stadio (read, decode,
+    append nel buffer, schedulazione del plot); snapshot() restituisce le
+    velocità calcolate sull'intervallo dalla chiamata precedente, da mostrare
+    nella status bar o salvare in JSON con dump_json().
+
+    I contatori del parser (o del processo di acquisizione) sono assoluti e
+    ripartono da zero a ogni power on: i totali accumulano gli incrementi di
+    ciascuna sorgente, ripartendo dal valore letto quando cambia la sorgente
+    o un contatore cala.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.t_start = time.perf_counter()
+        self.bytes_in = 0
+        self.frames = 0
+        self.samples = 0
+        self.samples_dropped = 0
+        self.bytes_discarded = 0
+        self.resyncs = 0
+        self.in_waiting = 0
+        self.in_waiting_max = 0
+        self.chunks = 0
+        self.stage_time = dict.fromkeys(STAGES, 0.0)
+
+        self._source = None
+        self._raw = {}                  # ultimo valore assoluto di ogni contatore della sorgente
+        self._prev_t = self.t_start
+        self._prev = (0, 0, 0, 0, dict(self.stage_time))
+        self.last = {}
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - t0)
+
+    def add_stage(self, name, seconds):
+        self.stage_time[name] += seconds
+
+    def update_from_parser(self, parser, samples=0):
+        """Aggiorna i contatori dopo una lettura del FrameParser"""
+        self.chunks += 1
+        self.samples += samples
+        self.update_from_stats(parser.bytes_in, parser.frames, parser.bytes_discarded, parser.resyncs,
+                               source=parser)
+        self.add_stage('read', parser.t_read)
+        self.add_stage('decode', parser.t_decode)
+
+    def update_from_stats(self, bytes_in, frames, bytes_discarded, resyncs, samples=None,
+                          chunks=None, stage_time=None, source=None):
+        """Aggiorna i totali da contatori assoluti della sorgente (parser o processo figlio);
+        stage_time: {stadio: secondi cumulativi} misurati dalla sorgente"""
+        if source is not self._source:
+            self._source = source
+            self._raw.clear()
+        self.bytes_in += self._advance('bytes_in', bytes_in)
+        self.frames += self._advance('frames', frames)
+        self.bytes_discarded += self._advance('bytes_discarded', bytes_discarded)
+        self.samples_dropped = self.bytes_discarded // FRAME_ALIGN
+        self.resyncs += self._advance('resyncs', resyncs)
+        if samples is not None:
+            self.samples += self._advance('samples', samples)
+        if chunks is not None:
+            self.chunks += self._advance('chunks', chunks)
+        for name, seconds in (stage_time or {}).items():
+            self.add_stage(name, self._advance(name, seconds))
+
+    def _advance(self, key, value):
+        """Incremento di un contatore assoluto dall'ultima lettura (da zero se è calato)"""
+        prev = self._raw.get(key, 0)
+        self._raw[key] = value
+        return value - prev if value >= prev else value
+
+    def observe_port(self, port):
+        """Riempimento del buffer di ingresso del sistema operativo"""
+        try:
+            n = port.in_waiting
+        except Exception:
+            return
+        self.in_waiting = n
+        self.in_waiting_max = max(self.in_waiting_max, n)
+
+    def snapshot(self):
+        """Dizionario con totali, velocità e tempi per stadio sull'ultimo intervallo"""
+        with self._lock:
+            now = time.perf_counter()
+            dt = max(now - self._prev_t, 1e-9)
+            p_bytes, p_frames, p_samples, p_chunks, p_stage = self._prev
+            chunks = self.chunks - p_chunks
+            stages = {}
+            for name in STAGES:
+                busy = self.stage_time[name] - p_stage[name]
+                stages[name] = {
+                    'ms_per_chunk': 1000 * busy / chunks if chunks else 0.0,
+                    'busy_pct': 100 * busy / dt,
+                }
+            snap = {
+                'uptime_s': now - self.t_start,
+                'bytes_per_s': (self.bytes_in - p_bytes) / dt,
+                'frames_per_s': (self.frames - p_frames) / dt,
+                'samples_per_s': (self.samples - p_samples) / dt,
+                'bytes_in': self.bytes_in,
+                'frames': self.frames,
+                'samples': self.samples,
+                'samples_dropped': self.samples_dropped,
+                'resyncs': self.resyncs,
+                'in_waiting': self.in_waiting,
+                'in_waiting_max': self.in_waiting_max,
+                'stages': stages,
+            }
+            self._prev_t = now
+            self._prev = (self.bytes_in, self.frames, self.samples, self.chunks, dict(self.stage_time))
+            self.last = snap
+            return snap
+
+    def status_text(self, snap=None):
+        """Riga compatta per la status bar"""
+        s = snap or self.last
+        if not s:
+            return ""
+        busiest = max(s['stages'].items(), key=lambda kv: kv[1]['busy_pct'])
+        return (f"{s['bytes_per_s'] / 1e3:.1f} kB/s | {s['frames_per_s']:.0f} frame/s | "
+                f"persi {s['samples_dropped']} | resync {s['resyncs']} | "
+                f"in_waiting {s['in_waiting']} B | "
+                f"stadio più carico: {busiest[0]} {busiest[1]['busy_pct']:.0f}%")
+
+    def to_json(self, snap=None):
+        return json.dumps(snap or self.last, indent=2)
+
+    def dump_json(self, path, snap=None):
+        with open(path, 'w') as f:
+            f.write(self.to_json(snap))
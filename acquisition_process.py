@@ -0,0 +1,238 @@
+"""Acquisizione in un processo separato
+
+Il processo figlio possiede la porta seriale, decodifica i frame con
+FrameParser e scrive i campioni in un buffer circolare in shared memory.
+Il processo della GUI legge solo la finestra dal buffer condiviso e inoltra
+i comandi al figlio tramite una coda, quindi Tk e matplotlib non competono
+più per il GIL con serial.read.
+"""
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+from serial_decoder import FrameParser
+from nvh_ports import open_port
+from read_policy import AdaptiveReadPolicy
+from gap_tracker import GapTracker
+
+# Campi di controllo (int64) in testa al blocco condiviso
+CTRL_HEAD = 0
+CTRL_COUNT = 1
+CTRL_RUNNING = 2
+CTRL_BYTES_IN = 3
+CTRL_BYTES_DISCARDED = 4
+CTRL_FRAMES = 5
+CTRL_FRAMES_BAD = 6
+CTRL_RESYNCS = 7
+CTRL_SAMPLES_LOST = 8
+CTRL_GAP_EVENTS = 9
+CTRL_SEQ = 10
+CTRL_CHUNKS = 11
+CTRL_T_READ_NS = 12         # tempi cumulativi per stadio del figlio [ns]
+CTRL_T_DECODE_NS = 13
+CTRL_T_APPEND_NS = 14
+N_CTRL = 15
+CTRL_BYTES = N_CTRL * 8
+
+
+class SharedRingBuffer(RingBuffer):
+    """RingBuffer con storage e cursori in multiprocessing.shared_memory
+
+    Con name=None crea il blocco condiviso, altrimenti si collega a quello
+    esistente senza azzerarlo. Anche il contatore seqlock sta nel blocco,
+    quindi snapshot() dal processo della GUI è coerente con le scritture
+    del processo di acquisizione.
+    """
+
+    def __init__(self, length, n_channels=3, dtype=np.float64, name=None):
+        dtype = np.dtype(dtype)
+        create = name is None
+        nbytes = CTRL_BYTES + 2 * int(length) * int(n_channels) * dtype.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=nbytes if create else 0)
+        self._owner = create
+        self._ctrl = np.ndarray((N_CTRL,), dtype=np.int64, buffer=self.shm.buf)
+        storage = np.ndarray((2 * int(length), int(n_channels)), dtype=dtype,
+                             buffer=self.shm.buf, offset=CTRL_BYTES)
+        if create:
+            self._ctrl.fill(0)
+            storage.fill(0)
+            super().__init__(length, n_channels, dtype, storage=storage)
+        else:
+            self.length = int(length)
+            self.n_channels = int(n_channels)
+            self._buf = storage
+            self.snapshot_retries = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def head(self):
+        return int(self._ctrl[CTRL_HEAD])
+
+    @head.setter
+    def head(self, value):
+        self._ctrl[CTRL_HEAD] = value
+
+    @property
+    def seq(self):
+        return int(self._ctrl[CTRL_SEQ])
+
+    @seq.setter
+    def seq(self, value):
+        self._ctrl[CTRL_SEQ] = value
+
+    @property
+    def count(self):
+        return int(self._ctrl[CTRL_COUNT])
+
+    @count.setter
+    def count(self, value):
+        self._ctrl[CTRL_COUNT] = value
+
+    def publish_parser_stats(self, parser, gaps=None, timing=None):
+        """timing: (letture, secondi cumulativi di read, decode, append) del figlio"""
+        self._ctrl[CTRL_BYTES_IN] = parser.bytes_in
+        self._ctrl[CTRL_BYTES_DISCARDED] = parser.bytes_discarded
+        self._ctrl[CTRL_FRAMES] = parser.frames
+        self._ctrl[CTRL_FRAMES_BAD] = parser.frames_bad
+        self._ctrl[CTRL_RESYNCS] = parser.resyncs
+        if gaps is not None:
+            self._ctrl[CTRL_SAMPLES_LOST] = gaps.lost
+            self._ctrl[CTRL_GAP_EVENTS] = len(gaps.events) + gaps.events_dropped
+        if timing is not None:
+            chunks, t_read, t_decode, t_append = timing
+            self._ctrl[CTRL_CHUNKS] = chunks
+            self._ctrl[CTRL_T_READ_NS] = int(t_read * 1e9)
+            self._ctrl[CTRL_T_DECODE_NS] = int(t_decode * 1e9)
+            self._ctrl[CTRL_T_APPEND_NS] = int(t_append * 1e9)
+
+    def parser_stats(self):
+        return {
+            'bytes_in': int(self._ctrl[CTRL_BYTES_IN]),
+            'bytes_discarded': int(self._ctrl[CTRL_BYTES_DISCARDED]),
+            'frames': int(self._ctrl[CTRL_FRAMES]),
+            'frames_bad': int(self._ctrl[CTRL_FRAMES_BAD]),
+            'resyncs': int(self._ctrl[CTRL_RESYNCS]),
+            'samples_lost': int(self._ctrl[CTRL_SAMPLES_LOST]),
+            'gap_events': int(self._ctrl[CTRL_GAP_EVENTS]),
+            'chunks': int(self._ctrl[CTRL_CHUNKS]),
+            'stage_time': {
+                'read': int(self._ctrl[CTRL_T_READ_NS]) / 1e9,
+                'decode': int(self._ctrl[CTRL_T_DECODE_NS]) / 1e9,
+                'append': int(self._ctrl[CTRL_T_APPEND_NS]) / 1e9,
+            },
+        }
+
+    def close(self):
+        # Le viste numpy vanno rilasciate prima di chiudere il blocco
+        del self._ctrl
+        del self._buf
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+def acquisition_main(port_name, shm_name, length, n_channels, cmd_queue, stop_event,
+                     chunk_bytes, record_path=None, replay_speed=1.0, max_latency=0.05,
+                     Tserial=0.5e-3, gaps_path=None):
+    """Loop del processo figlio: legge, decodifica, scrive nel buffer condiviso"""
+    ring = SharedRingBuffer(length, n_channels, name=shm_name)
+    recorder = None
+    try:
+        # Timeout = budget di latenza: anche i comandi in coda vengono inoltrati entro max_latency
+        port = open_port(port_name, timeout=max_latency, replay_speed=replay_speed)
+    except Exception as e:
+        print(f"Processo di acquisizione: impossibile aprire {port_name}: {e}")
+        ring.close()
+        return
+
+    parser = FrameParser(chunk_bytes)
+    policy = AdaptiveReadPolicy(max_latency=max_latency, max_chunk=chunk_bytes)
+    gaps = GapTracker(Tserial)
+    if record_path:
+        from capture import RawRecorder
+        recorder = RawRecorder(record_path)
+        parser.tap = recorder.record
+
+    chunks, t_read, t_decode, t_append = 0, 0.0, 0.0, 0.0
+    ring._ctrl[CTRL_RUNNING] = 1
+    try:
+        while not stop_event.is_set() and port.is_open:
+            while True:
+                try:
+                    port.write(cmd_queue.get_nowait())
+                except queue.Empty:
+                    break
+            data = parser.read(port, policy.next_size(port.in_waiting))
+            policy.observe(parser.nread)
+            gaps.update(parser)
+            chunks += 1
+            t_read += parser.t_read
+            t_decode += parser.t_decode
+            if data is not None:
+                t0 = time.perf_counter()
+                ring.append(data)
+                t_append += time.perf_counter() - t0
+            ring.publish_parser_stats(parser, gaps, (chunks, t_read, t_decode, t_append))
+    except Exception as e:
+        print(f"Processo di acquisizione terminato: {e}")
+    finally:
+        ring._ctrl[CTRL_RUNNING] = 0
+        if recorder:
+            recorder.close()
+        # Gap map della sessione, se richiesta
+        if gaps_path and gaps.received:
+            gaps.save(gaps_path)
+        port.close()
+        ring.close()
+
+
+class ProcessAcquisition:
+    """Lato GUI dell'acquisizione in processo separato
+
+    Espone write/is_open/close come una porta seriale (per l'invio dei comandi)
+    e il buffer condiviso in self.ring, da usare al posto del RingBuffer locale.
+    """
+
+    def __init__(self, port_name, length, n_channels=3, chunk_bytes=12012,
+                 record_path=None, replay_speed=1.0, max_latency=0.05, Tserial=0.5e-3,
+                 gaps_path=None):
+        ctx = mp.get_context('spawn')
+        self.port = port_name
+        self.ring = SharedRingBuffer(length, n_channels)
+        self._cmd_queue = ctx.Queue()
+        self._stop = ctx.Event()
+        self.process = ctx.Process(
+            target=acquisition_main,
+            args=(port_name, self.ring.name, length, n_channels, self._cmd_queue, self._stop,
+                  chunk_bytes, record_path, replay_speed, max_latency, Tserial, gaps_path),
+            daemon=True,
+        )
+        self.process.start()
+
+    @property
+    def is_open(self):
+        return self.process.is_alive() and not self._stop.is_set()
+
+    def write(self, data):
+        self._cmd_queue.put(bytes(data))
+        return len(data)
+
+    def reset_input_buffer(self):
+        pass
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self._stop.set()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
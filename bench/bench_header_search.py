@@ -0,0 +1,203 @@
+"""Micro-benchmark della decodifica: versione a liste vs serial_decoder
+
+decode_block e SerialDecoder sono le versioni intermedie (un blocco alla
+volta, senza stato tra le letture) da cui deriva FrameParser: restano qui
+come riferimento per il confronto, l'applicazione usa solo FrameParser.
+
+Uso: python bench/bench_header_search.py [n_blocchi]
+"""
+import io
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from serial_decoder import HEADER, N_CH, SCALE, FrameParser
+
+
+def find_headers(words):
+    """Restituisce gli indici (in uint16) di inizio di ogni header nel blocco"""
+    words = np.asarray(words)
+    if words.size < 2:
+        return np.empty(0, dtype=np.intp)
+    return np.flatnonzero((words[:-1] == HEADER[0]) & (words[1:] == HEADER[1]))
+
+
+def strip_headers(words, headPos):
+    """Rimuove gli header trovati da find_headers (equivale ai del in ordine inverso)"""
+    words = np.asarray(words)
+    if len(headPos) == 0:
+        return words
+    keep = np.ones(words.size, dtype=bool)
+    keep[headPos] = False
+    keep[np.asarray(headPos) + 1] = False
+    return words[keep]
+
+
+def decode_block(rawdata):
+    """Decodifica un blocco letto da seriale in un array float32 (N, 3)
+
+    Restituisce (data_float, headPos); data_float è None se nel blocco non
+    c'è nessun header o se dopo il riallineamento restano meno di 3 valori.
+    """
+    words = np.frombuffer(rawdata, dtype='<u2', count=len(rawdata) // 2)
+    headPos = find_headers(words)
+    if headPos.size == 0:
+        return None, headPos
+
+    words = strip_headers(words, headPos)
+
+    # Riallinea i dati a multipli di 3
+    istart = headPos[0] % N_CH
+    iend = istart + ((words.size - istart) // N_CH) * N_CH
+    aligned = words[istart:iend]
+    if aligned.size < N_CH:
+        return None, headPos
+
+    # Converti fixed-point signed (1,16,9)
+    data_float = aligned.view(np.int16).reshape(-1, N_CH).astype(np.float32) * np.float32(SCALE)
+    return data_float, headPos
+
+
+class SerialDecoder:
+    """Decoder senza allocazioni per blocco
+
+    I byte vengono letti con readinto in un bytearray preallocato e
+    interpretati in place con np.frombuffer; la conversione Q(1,16,9) viene
+    scritta in un array float32 riutilizzato. L'array restituito da read() e
+    decode() è una vista sul buffer interno: va copiato (o accodato al
+    buffer circolare) prima della lettura successiva.
+    """
+
+    def __init__(self, nbytes):
+        self.nbytes = nbytes - nbytes % 2
+        self.rx = bytearray(self.nbytes)
+        self._rx_view = memoryview(self.rx)
+        self._words = np.frombuffer(self.rx, dtype='<u2')
+        nwords = self._words.size
+        self._mask0 = np.empty(nwords, dtype=bool)
+        self._mask1 = np.empty(nwords, dtype=bool)
+        self._stripped = np.empty(nwords, dtype=np.int16)
+        self._flat = np.empty(nwords, dtype=np.float32)
+        self.headPos = np.empty(0, dtype=np.intp)
+        self.nread = 0
+
+    def read(self, port):
+        """Legge un blocco da port (serial.Serial o compatibile) e lo decodifica"""
+        self.nread = port.readinto(self._rx_view) or 0
+        return self.decode(self.nread)
+
+    def decode(self, nbytes):
+        """Decodifica i primi nbytes di self.rx in una vista float32 (N, 3)"""
+        words = self._words[:nbytes // 2]
+        n = words.size
+        if n < 2:
+            self.headPos = np.empty(0, dtype=np.intp)
+            return None
+
+        # Ricerca header con maschere preallocate
+        m0 = self._mask0[:n - 1]
+        m1 = self._mask1[:n - 1]
+        np.equal(words[:-1], HEADER[0], out=m0)
+        np.equal(words[1:], HEADER[1], out=m1)
+        np.logical_and(m0, m1, out=m0)
+        self.headPos = np.flatnonzero(m0)
+        if self.headPos.size == 0:
+            return None
+
+        # Rimuovi gli header senza allocare: compress su buffer preallocato
+        keep = self._mask1[:n]
+        keep.fill(True)
+        keep[self.headPos] = False
+        keep[self.headPos + 1] = False
+        k = n - 2 * self.headPos.size
+        stripped = np.compress(keep, words.view(np.int16), out=self._stripped[:k])
+
+        # Riallinea i dati a multipli di 3 e converti fixed-point signed (1,16,9)
+        istart = self.headPos[0] % N_CH
+        iend = istart + ((k - istart) // N_CH) * N_CH
+        if iend - istart < N_CH:
+            return None
+        out = self._flat[:iend - istart]
+        np.multiply(stripped[istart:iend], np.float32(SCALE), out=out)
+        return out.reshape(-1, N_CH)
+
+
+def make_block(n_words=6006, samples_per_frame=200, seed=0):
+    """Blocco sintetico: header + terne int16 Q9, tagliato a n_words"""
+    rng = np.random.default_rng(seed)
+    words = []
+    while len(words) < n_words:
+        words.extend(HEADER)
+        data = (rng.standard_normal((samples_per_frame, 3)) * 5 * 2**9).astype(np.int16)
+        words.extend(data.view(np.uint16).ravel().tolist())
+    return struct.pack('<' + 'H' * n_words, *words[:n_words])
+
+
+def decode_legacy(rawdata):
+    """Percorso originale di read_serial_data / run_test"""
+    rawdata_uint16 = list(struct.unpack('<' + 'H' * (len(rawdata) // 2), rawdata))
+    header = [17733, 21331]
+    pos = [i for i in range(len(rawdata_uint16) - 1) if rawdata_uint16[i:i + 2] == header]
+    for idx in reversed(pos):
+        del rawdata_uint16[idx:idx + 2]
+    istart = (pos[0] % 3)
+    rawdata_aligned = rawdata_uint16[istart:]
+    iend = (len(rawdata_aligned) // 3) * 3
+    rawdata_aligned = rawdata_aligned[:iend]
+    data = np.array(rawdata_aligned, dtype=np.uint16).reshape(-1, 3)
+    return data.view(dtype=np.int16).astype(np.float32) / 2**9
+
+
+def bench(fn, block, n_iter):
+    n_samples = 0
+    t0 = time.perf_counter()
+    for _ in range(n_iter):
+        n_samples += len(fn(block))
+    return n_samples / (time.perf_counter() - t0)
+
+
+def main():
+    n_iter = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    block = make_block()
+
+    ref = decode_legacy(block)
+    new, _ = decode_block(block)
+    assert np.array_equal(ref, new), "decode_block diverge dal percorso originale"
+
+    legacy = bench(decode_legacy, block, n_iter)
+    vectorized = bench(lambda b: decode_block(b)[0], block, n_iter)
+    decoder = SerialDecoder(len(block))
+    port = io.BytesIO(block)
+
+    def zero_copy(_):
+        port.seek(0)
+        return decoder.read(port)
+
+    assert np.array_equal(ref, zero_copy(block)), "SerialDecoder diverge dal percorso originale"
+    readinto = bench(zero_copy, block, n_iter)
+
+    # FrameParser emette solo frame completi: l'ultimo frame del blocco resta in attesa
+    parser = FrameParser(len(block))
+
+    def frame_parser(_):
+        port.seek(0)
+        parser.fill = 0
+        parser.synced = False
+        return parser.read(port)
+
+    frames = frame_parser(block)
+    assert np.array_equal(ref[:len(frames)], frames), "FrameParser diverge dal percorso originale"
+    incremental = bench(frame_parser, block, n_iter)
+    print(f"blocco: {len(block)} byte, {n_iter} iterazioni")
+    print(f"legacy     : {legacy:12.0f} campioni/s")
+    print(f"vettoriale : {vectorized:12.0f} campioni/s  (x{vectorized / legacy:.1f})")
+    print(f"readinto   : {readinto:12.0f} campioni/s  (x{readinto / legacy:.1f})")
+    print(f"FrameParser: {incremental:12.0f} campioni/s  (x{incremental / legacy:.1f})")
+
+
+if __name__ == "__main__":
+    main()
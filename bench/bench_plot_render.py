@@ -0,0 +1,88 @@
+"""Confronto fps/CPU dei renderer del grafico live (backend Agg, senza display)
+
+Riproduce la figura di NVHApp.setup_plot (2 assi, 3 linee da 20000 punti)
+e la aggiorna con blocchi di un segnale sinusoidale come durante un test,
+con e senza inviluppo min/max per pixel (plot_lod), anche su finestre lunghe.
+
+Uso: python bench/bench_plot_render.py [n_aggiornamenti]
+"""
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from plot_lod import EnvelopeLOD
+from plot_renderer import RENDERERS
+from ring_buffer import RingBuffer
+
+Tserial = 0.5e-3
+CHUNK = 100
+
+
+def make_figure(window_s=10):
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 6))
+    fig.tight_layout(pad=3.0)
+    ax1.set_xlim(0, window_s)
+    ax1.set_ylim(-25, 25)
+    ax1.grid(True, alpha=0.3)
+    line_ref, = ax1.plot([], [], 'b-', label='Target', linewidth=1.5)
+    line_meas, = ax1.plot([], [], 'r-', label='Rilevata', linewidth=1.5)
+    ax1.legend(loc='upper right')
+    ax2.set_xlim(0, window_s)
+    ax2.set_ylim(-1, 10)
+    ax2.grid(True, alpha=0.3)
+    line_state, = ax2.plot([], [], 'g-', linewidth=1.5)
+    fig.canvas.draw()
+    return fig, ax1, (line_ref, line_meas), line_state
+
+
+def run(name, n_updates, lod=False, window_s=10):
+    Ntot = int(window_s / Tserial)
+    fig, ax1, lines_pos, line_state = make_figure(window_s)
+    renderer = RENDERERS[name](fig.canvas, ax1, lines_pos, line_state)
+    buf = RingBuffer(Ntot, n_channels=3)
+    env = EnvelopeLOD(Ntot, 3, n_bins=int(ax1.bbox.width), Tserial=Tserial) if lod else None
+    t = np.arange(Ntot) * Tserial
+    rng = np.random.default_rng(0)
+    # Riempio la finestra prima di misurare
+    tt = np.arange(Ntot) * Tserial
+    ref = 5 * np.sin(2 * np.pi * 2 * tt)
+    buf.append(np.column_stack([ref, ref + 0.05 * rng.standard_normal(Ntot), np.full(Ntot, 2.0)]))
+    if env:
+        env.append(buf.view())
+    k = Ntot
+
+    w0, c0 = time.perf_counter(), time.process_time()
+    for _ in range(n_updates):
+        tt = (k + np.arange(CHUNK)) * Tserial
+        ref = 5 * np.sin(2 * np.pi * 2 * tt)
+        block = np.column_stack([ref, ref + 0.05 * rng.standard_normal(CHUNK), np.full(CHUNK, 2.0)])
+        buf.append(block)
+        k += CHUNK
+        if env:
+            env.append(block)
+            renderer.update(*env.envelope())
+        else:
+            renderer.update(t, buf.view())
+    wall = time.perf_counter() - w0
+    cpu = time.process_time() - c0
+    plt.close(fig)
+    label = f"{name}{'+lod' if lod else ''} {window_s:g}s"
+    print(f"{label:<20} {n_updates / wall:8.1f} fps  {1000 * cpu / n_updates:7.2f} ms CPU/frame  "
+          f"ridisegni completi {renderer.full_draws}, blit {renderer.blits}")
+    return n_updates / wall
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    base = run('draw_idle', n)
+    blit = run('blit', n)
+    print(f"speedup blit/draw_idle: {blit / base:.1f}x")
+    run('blit', n, lod=True)
+    run('draw_idle', n // 4, window_s=120)
+    run('blit', n, lod=True, window_s=120)
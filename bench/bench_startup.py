@@ -0,0 +1,87 @@
+"""Costo degli import all'avvio (python -X importtime)
+
+Importa i moduli indicati in un interprete nuovo con -X importtime e
+mostra il tempo totale e gli import diretti più pesanti di ciascuno.
+Controlla anche che i pacchetti caricati solo su richiesta (python-control,
+pandas, scipy, matplotlib, PIL) non compaiano negli import di avvio; con
+--max-ms il totale diventa una soglia. Esce con codice 1 se un controllo
+fallisce, così si può usare in CI.
+
+Uso: python bench/bench_startup.py [--runs N] [--max-ms MS] [modulo ...]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFERRED = ('control', 'pandas', 'scipy', 'matplotlib', 'PIL')
+LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_times(module):
+    """{import diretto di module: µs cumulativi}, µs totali di module e insieme dei pacchetti caricati"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} fallito:\n{proc.stderr[-2000:]}")
+    # I figli compaiono prima del genitore, rientrati di 2 spazi in più
+    pending = []
+    children, total = {}, 0
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)) // 2, m.group(4)
+        loaded.add(name.split('.')[0])
+        direct = {}
+        while pending and pending[-1][0] > depth:
+            d, child, us = pending.pop()
+            if d == depth + 1:
+                direct[child] = us
+        if depth == 0 and name == module:
+            children, total = direct, cumulative
+        pending.append((depth, name, cumulative))
+    return children, total, loaded
+
+
+def measure(module, runs):
+    """Minimo su più esecuzioni: meno rumore da cache del disco e scheduler"""
+    best, best_total, loaded = {}, None, set()
+    for _ in range(runs):
+        children, total, loaded = import_times(module)
+        for name, us in children.items():
+            best[name] = min(us, best.get(name, us))
+        best_total = total if best_total is None else min(total, best_total)
+    return best, best_total, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=['params_NVH', 'NVHApp_V2'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--max-ms', type=float, help="soglia sul tempo totale di import [ms]")
+    args = parser.parse_args()
+
+    ok = True
+    for module in args.modules:
+        children, total, loaded = measure(module, args.runs)
+        total /= 1000
+        print(f"{module}: {total:.0f} ms (minimo su {args.runs} esecuzioni)")
+        for name, us in sorted(children.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"    {name:<32} {us / 1000:8.1f} ms")
+        eager = [name for name in DEFERRED if name in loaded]
+        if eager:
+            print(f"    ERRORE: importati all'avvio: {', '.join(eager)}")
+            ok = False
+        if args.max_ms is not None and total > args.max_ms:
+            print(f"    ERRORE: {total:.0f} ms oltre la soglia di {args.max_ms:.0f} ms")
+            ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
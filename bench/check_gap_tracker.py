@@ -0,0 +1,77 @@
+"""Verifica del conteggio perdite di GapTracker su stream simulati
+
+- sessione iniziata a metà frame: i byte prima del primo header non sono
+  una perdita (lost == 0, nessun evento);
+- byte cancellati a metà sessione: evento 'discarded' con lost > 0;
+- frame interi mai arrivati (invisibili nello stream): evento 'host_gap'
+  dai timestamp dell'host;
+- power off/on con un nuovo parser e una pausa: reset() non conta la pausa
+  come campioni mancanti.
+
+Uso: python bench/check_gap_tracker.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from gap_tracker import GapTracker
+from nvh_simulator import RigSimulator
+from serial_decoder import FrameParser
+
+Tserial = 0.5e-3
+BLOCK = 200         # campioni per lettura (2 frame da 100)
+
+
+def run(skip_head=0, delete_at=None, missing=(), n_blocks=200, restart_at=None, pause=30.0):
+    """Alimenta parser e tracker blocco per blocco con timestamp dell'host a tempo reale"""
+    sim = RigSimulator(Tserial, seed=0)
+    parser = FrameParser(1 << 16)
+    gaps = GapTracker(Tserial)
+    t = 0.0
+    for i in range(n_blocks):
+        if i == restart_at:
+            # Power off/on: nuovo parser, riparte a metà frame dopo la pausa
+            parser = FrameParser(1 << 16)
+            gaps.reset(parser)
+            t += pause
+            skip_head, restart_head = 0, 37
+        else:
+            restart_head = 0
+        data = sim.generate(BLOCK)
+        t += BLOCK * Tserial
+        if i == 0:
+            data = data[skip_head:]
+        data = data[restart_head:]
+        if i == delete_at:
+            data = data[:100] + data[137:]
+        if i in missing:
+            continue            # frame mai arrivati
+        parser.feed(data)
+        gaps.update(parser, t_host=t)
+    return gaps
+
+
+def main():
+    ok = True
+
+    def check(name, cond, gaps):
+        nonlocal ok
+        s = gaps.summary()
+        print(f"{'OK    ' if cond else 'ERRORE'} {name}: lost {s['lost']}, lost_host {s['lost_host']}, "
+              f"eventi {[e['reason'] for e in gaps.events]}")
+        ok &= bool(cond)
+
+    g = run(skip_head=37)
+    check("inizio a metà frame", g.lost == 0 and g.lost_host == 0 and not g.events, g)
+    g = run(skip_head=37, delete_at=50)
+    check("byte cancellati", g.lost > 0 and [e['reason'] for e in g.events] == ['discarded'], g)
+    g = run(missing=range(50, 55), n_blocks=400)       # 0.5 s
+    check("frame mancanti", g.lost == 0 and g.lost_host >= 0.9 * 0.5 / Tserial
+          and [e['reason'] for e in g.events] == ['host_gap'], g)
+    g = run(skip_head=37, restart_at=100)
+    check("nuovo parser dopo una pausa", g.lost == 0 and g.lost_host == 0 and not g.events, g)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Parità tra Tustin in forma chiusa (tustin_quarter_car) e ctrl.sample_system
+
+Estrae n varianti casuali del quarter car attorno ai valori del banco,
+le discretizza in una sola chiamata vettorizzata e confronta ogni riga con
+sample_quarter_car (python-control). Stampa errore massimo e tempi; esce con
+codice 1 se una variante supera la tolleranza.
+
+Uso: python bench/check_tustin_parity.py [n_varianti]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from params_NVH import QUARTER_CAR, sample_quarter_car, tustin_quarter_car
+
+RTOL = 1e-9
+
+
+def variants(n, seed=0):
+    """Parametri entro un fattore 3 dai default, Tref tra 1 e 10 ms"""
+    rng = np.random.default_rng(seed)
+    p = {k: v * np.exp(rng.uniform(np.log(1 / 3), np.log(3), n)) for k, v in QUARTER_CAR.items()}
+    p['Tref'] = rng.uniform(1e-3, 10e-3, n)
+    return p
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    p = variants(n)
+    args = [p[k] for k in ('Tref', 'ms', 'mu', 'ks', 'ku', 'cs')]
+
+    t0 = time.perf_counter()
+    numz, denz = tustin_quarter_car(*args)
+    t_vec = time.perf_counter() - t0
+
+    sample_quarter_car(*(a[0] for a in args))        # import di python-control fuori dal tempo
+    t0 = time.perf_counter()
+    ref = [sample_quarter_car(*(a[i] for a in args)) for i in range(n)]
+    t_ctrl = time.perf_counter() - t0
+
+    # Errore relativo alla scala di ogni polinomio (i termini dispari di numz sono ~0)
+    err_num = max(np.max(np.abs(numz[i] - r[0])) / np.max(np.abs(r[0])) for i, r in enumerate(ref))
+    err_den = max(np.max(np.abs(denz[i] - r[1])) / np.max(np.abs(r[1])) for i, r in enumerate(ref))
+    print(f"{n} varianti: errore relativo massimo numz {err_num:.2e}, denz {err_den:.2e}")
+    print(f"forma chiusa {1000 * t_vec:.2f} ms, python-control {1000 * t_ctrl:.0f} ms "
+          f"({t_ctrl / t_vec:.0f}x)")
+    ok = err_num < RTOL and err_den < RTOL
+    print("OK" if ok else f"ERRORE: oltre la tolleranza {RTOL:g}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Registrazione e replay dei byte grezzi ricevuti dalla seriale
+
+Formato file (little-endian):
+    header  : magic b"NVHCAP01", uint64 data_end (offset della fine dei dati validi)
+    record  : int64 t_ns (time.time_ns() alla ricezione), uint32 n, n byte
+
+Il file è preallocato e mappato in memoria; quando si riempie viene
+raddoppiato e rimappato. Alla chiusura viene troncato a data_end.
+"""
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"NVHCAP01"
+FILE_HEADER = struct.Struct('<8sQ')
+RECORD_HEADER = struct.Struct('<qI')
+
+
+class RawRecorder:
+    """Recorder non bloccante per il thread di acquisizione
+
+    record() copia i byte in una coda limitata e ritorna subito; un thread
+    dedicato li scrive nel file mappato. Se la coda è piena il blocco viene
+    scartato e conteggiato in dropped_chunks/dropped_bytes, così il reader
+    non attende mai il disco.
+    """
+
+    def __init__(self, path, initial_size=64 << 20, max_queue=1024):
+        self.path = path
+        self.dropped_chunks = 0
+        self.dropped_bytes = 0
+        self.bytes_written = 0
+        self.records = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self._file = open(path, 'w+b')
+        self._size = max(int(initial_size), FILE_HEADER.size + RECORD_HEADER.size)
+        self._file.truncate(self._size)
+        self._mm = mmap.mmap(self._file.fileno(), self._size)
+        self._end = FILE_HEADER.size
+        FILE_HEADER.pack_into(self._mm, 0, MAGIC, self._end)
+
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def record(self, data, t_ns=None):
+        """Accoda un blocco ricevuto (chiamato dal thread di lettura)"""
+        if t_ns is None:
+            t_ns = time.time_ns()
+        try:
+            self._queue.put_nowait((t_ns, bytes(data)))
+        except queue.Full:
+            self.dropped_chunks += 1
+            self.dropped_bytes += len(data)
+
+    def close(self):
+        """Svuota la coda, scrive data_end e tronca il file alla dimensione usata"""
+        if self._mm is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        self._file.truncate(self._end)
+        self._file.close()
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Scrivo a lotti quello che si è accumulato nel frattempo
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(batch)
+                    return
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        need = sum(RECORD_HEADER.size + len(data) for _, data in batch)
+        if self._end + need > self._size:
+            self._grow(self._end + need)
+        mm = self._mm
+        end = self._end
+        for t_ns, data in batch:
+            RECORD_HEADER.pack_into(mm, end, t_ns, len(data))
+            end += RECORD_HEADER.size
+            mm[end:end + len(data)] = data
+            end += len(data)
+            self.records += 1
+            self.bytes_written += len(data)
+        self._end = end
+        # data_end aggiornato dopo i dati: un file interrotto resta leggibile fin lì
+        FILE_HEADER.pack_into(mm, 0, MAGIC, end)
+
+    def _grow(self, min_size):
+        size = self._size
+        while size < min_size:
+            size *= 2
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._size = size
+
+
+def default_capture_path(directory='captures'):
+    """Percorso con data e ora per una nuova registrazione"""
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, time.strftime('nvh_%Y%m%d_%H%M%S.nvhcap'))
+
+
+class CaptureReader:
+    """Accesso in sola lettura a un file .nvhcap mappato in memoria"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, data_end = FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: non è un file di cattura NVH")
+        self.data_end = min(data_end, len(self._mm))
+
+        # Indice dei record: timestamp, offset dei dati, lunghezza
+        t_ns, offsets, lengths = [], [], []
+        pos = FILE_HEADER.size
+        while pos + RECORD_HEADER.size <= self.data_end:
+            t, n = RECORD_HEADER.unpack_from(self._mm, pos)
+            pos += RECORD_HEADER.size
+            if pos + n > self.data_end:
+                break
+            t_ns.append(t)
+            offsets.append(pos)
+            lengths.append(n)
+            pos += n
+        self.t_ns = np.array(t_ns, dtype=np.int64)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.cum_bytes = np.cumsum(self.lengths)
+
+    def __len__(self):
+        return len(self.t_ns)
+
+    @property
+    def total_bytes(self):
+        return int(self.cum_bytes[-1]) if len(self.cum_bytes) else 0
+
+    @property
+    def duration(self):
+        return (self.t_ns[-1] - self.t_ns[0]) * 1e-9 if len(self.t_ns) else 0.0
+
+    def record(self, i):
+        """(t_ns, memoryview dei byte) del record i"""
+        off = int(self.offsets[i])
+        return int(self.t_ns[i]), memoryview(self._mm)[off:off + int(self.lengths[i])]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+class ReplaySerial:
+    """Rilegge una cattura con la stessa interfaccia di serial.Serial
+
+    speed=1 riproduce con i tempi originali di ricezione, speed=50 cinquanta
+    volte più veloce, speed=None (o 0) il più velocemente possibile. A fine
+    file la porta risulta chiusa (is_open False), così il loop di lettura
+    termina come alla disconnessione del banco. Le scritture (comandi) sono
+    solo contate.
+    """
+
+    def __init__(self, path, speed=1.0, timeout=2):
+        self.reader = CaptureReader(path)
+        self.port = f"replay:{path}"
+        self.speed = speed or None
+        self.timeout = timeout
+        self.baudrate = 12_000_000
+        self.is_open = True
+        self.bytes_written = 0
+        self._rec = 0           # record corrente
+        self._rec_off = 0       # byte già letti del record corrente
+        self._consumed = 0
+        if len(self.reader):
+            self._t_rec = (self.reader.t_ns - self.reader.t_ns[0]) * 1e-9
+        else:
+            self._t_rec = np.empty(0)
+        self._t0 = time.perf_counter()
+
+    def _available_total(self):
+        """Byte della cattura già 'arrivati' secondo il clock di replay"""
+        if self.speed is None:
+            return self.reader.total_bytes
+        elapsed = (time.perf_counter() - self._t0) * self.speed
+        idx = np.searchsorted(self._t_rec, elapsed, side='right')
+        return int(self.reader.cum_bytes[idx - 1]) if idx else 0
+
+    def _arrival_wait(self, target):
+        """Secondi di attesa (tempo reale) finché sono arrivati target byte in totale"""
+        # Primo record che porta il totale ricevuto ad almeno target byte
+        idx = min(int(np.searchsorted(self.reader.cum_bytes, target)), len(self._t_rec) - 1)
+        elapsed = (time.perf_counter() - self._t0) * self.speed
+        return max(0.0, (self._t_rec[idx] - elapsed) / self.speed)
+
+    @property
+    def in_waiting(self):
+        return self._available_total() - self._consumed
+
+    def readinto(self, b):
+        size = len(b)
+        if self.speed is not None:
+            deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+            target = min(self._consumed + size, self.reader.total_bytes)
+            # Un solo sleep fino all'arrivo del record che completa la lettura (o al timeout)
+            while self._available_total() < target:
+                wait = self._arrival_wait(target)
+                if deadline is not None:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    wait = min(wait, remaining)
+                time.sleep(wait)
+        n = min(size, self.in_waiting)
+
+        k = 0
+        while k < n:
+            _, data = self.reader.record(self._rec)
+            m = min(n - k, len(data) - self._rec_off)
+            b[k:k + m] = data[self._rec_off:self._rec_off + m]
+            k += m
+            self._rec_off += m
+            if self._rec_off == len(data):
+                self._rec += 1
+                self._rec_off = 0
+        self._consumed += n
+        if self._rec >= len(self.reader):
+            self.is_open = False
+        return n
+
+    def read(self, size=1):
+        buf = bytearray(size)
+        n = self.readinto(buf)
+        return bytes(buf[:n])
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+    def reset_output_buffer(self):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        self.reader.close()
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class CommandLatencyTracker:
+    """Latenza comando → risposta del banco
+
+    sent() registra l'istante di ogni comando inviato e lo stato st atteso
+    (CommandFrame.expected_state); observe() cerca nei blocchi decodificati
+    la prima transizione verso quello stato, cioè un campione nello stato
+    atteso preceduto da uno in uno stato diverso. I comandi il cui stato
+    atteso coincide con quello corrente del banco (es. posizionamento già
+    attivo) non producono transizioni: sono contati in unchanged e non
+    misurati. Le latenze sono raccolte per tipo di comando (power_on, test,
+    stop, ...).
+
+    Il tempo del campione è stimato dall'istante in cui il blocco viene
+    passato a observe() meno i campioni successivi * Tserial, così la
+    risoluzione non dipende dalla dimensione delle letture; i byte però
+    possono essere arrivati prima (budget di latenza della lettura, polling
+    del buffer condiviso in modalità processo), quindi le latenze sono in
+    eccesso fino a t_error [s], riportato nel report.
+    """
+
+    def __init__(self, Tserial, timeout=5.0, max_samples=10000, t_error=0.0):
+        self.Tserial = Tserial
+        self.timeout = timeout
+        self.max_samples = max_samples
+        self.t_error = t_error
+        self.latencies = {}     # kind -> lista di latenze [s]
+        self.timeouts = 0
+        self.unchanged = 0
+        self.state = np.nan     # stato dell'ultimo campione ricevuto
+        self.last = None        # (kind, latenza [s]) dell'ultimo comando confermato
+        self._pending = []      # (kind, stato atteso, t invio)
+        self._lock = threading.Lock()
+
+    def sent(self, frame, t=None):
+        """Da chiamare subito dopo la write del comando"""
+        if t is None:
+            t = time.perf_counter()
+        expected = frame.expected_state()
+        with self._lock:
+            # Un nuovo comando sostituisce quelli non ancora confermati
+            if expected == self.state:
+                self.unchanged += 1
+                self._pending = []
+            else:
+                self._pending = [(frame.kind, expected, t)]
+
+    def observe(self, st, t_block=None):
+        """Cerca le transizioni attese nel canale st di un blocco appena ricevuto"""
+        if not len(st):
+            return
+        states = np.rint(st)
+        prev_state, self.state = self.state, states[-1]
+        if not self._pending:
+            return
+        if t_block is None:
+            t_block = time.perf_counter()
+        # Stato del campione precedente (il primo confronta con l'ultimo del blocco prima)
+        prev = np.empty_like(states)
+        prev[0] = prev_state
+        prev[1:] = states[:-1]
+        # Istante stimato di ogni campione del blocco
+        t_samples = t_block - np.arange(len(states) - 1, -1, -1) * self.Tserial
+        with self._lock:
+            keep = []
+            for kind, state, t_sent in self._pending:
+                # prev nan: stato precedente ignoto, non è una transizione osservata
+                hit = np.flatnonzero((states == state) & (prev != state) & ~np.isnan(prev)
+                                     & (t_samples >= t_sent))
+                if len(hit):
+                    self._add(kind, t_samples[hit[0]] - t_sent)
+                elif t_block - t_sent > self.timeout:
+                    self.timeouts += 1
+                else:
+                    keep.append((kind, state, t_sent))
+            self._pending = keep
+
+    def _add(self, kind, latency):
+        samples = self.latencies.setdefault(kind, [])
+        if len(samples) >= self.max_samples:
+            del samples[0]
+        samples.append(latency)
+        self.last = (kind, latency)
+
+    def summary(self):
+        """Distribuzione delle latenze [ms] per tipo di comando"""
+        with self._lock:
+            out = {'timeouts': self.timeouts, 'unchanged': self.unchanged, 't_error_ms': 1000 * self.t_error}
+            for kind, samples in self.latencies.items():
+                ms = 1000 * np.asarray(samples)
+                p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+                out[kind] = {
+                    'n': len(ms),
+                    'min_ms': float(ms.min()),
+                    'p50_ms': float(p50),
+                    'p90_ms': float(p90),
+                    'p99_ms': float(p99),
+                    'max_ms': float(ms.max()),
+                }
+            return out
+
+    def status_text(self):
+        if self.last is None:
+            return ""
+        kind, latency = self.last
+        return f"{kind}→st {1000 * latency:.1f} ms"
+
+    def report(self):
+        """Tabella testuale della distribuzione"""
+        s = self.summary()
+        lines = [f"{'comando':<12} {'n':>5} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  [ms]"]
+        for kind, d in s.items():
+            if not isinstance(d, dict):
+                continue
+            lines.append(f"{kind:<12} {d['n']:>5} {d['p50_ms']:>8.1f} {d['p90_ms']:>8.1f} "
+                         f"{d['p99_ms']:>8.1f} {d['max_ms']:>8.1f}")
+        lines.append(f"timeout: {s['timeouts']}, senza cambio di stato: {self.unchanged}")
+        if self.t_error:
+            lines.append(f"tempi stimati all'elaborazione dei blocchi: in eccesso fino a "
+                         f"{1000 * self.t_error:.0f} ms")
+        return "\n".join(lines)
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+
+from serial_decoder import FRAME_ALIGN
+
+
+def sidecar_path(capture_path):
+    """File della gap map salvato accanto alla registrazione"""
+    return str(capture_path) + '.gaps.json'
+
+
+def session_gap_path(record_path=None, directory='captures'):
+    """Gap map della sessione: accanto alla registrazione, altrimenti in captures/ con data e ora
+    (solo quando la gap map è richiesta: crea la cartella)"""
+    if record_path:
+        return sidecar_path(record_path)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, time.strftime('nvh_%Y%m%d_%H%M%S.gaps.json'))
+
+
+class GapTracker:
+    """Conteggio dei campioni persi in una sessione di acquisizione
+
+    Per ogni lettura confronta quanto emesso dal FrameParser con l'atteso:
+    - la dimensione tipica dei frame (campioni tra due header) viene appresa
+      dai primi frame, e i frame più corti contano come campioni mancanti;
+    - i byte scartati dal parser diventano campioni persi: il parser scarta
+      solo frame interi, quindi si arrotonda a frame completi (6 byte a
+      campione finché la dimensione dei frame non è nota);
+    - con i timestamp dell'host si stima quanti campioni sarebbero dovuti
+      arrivare (tempo trascorso / Tserial): quando il deficit rispetto a
+      ricevuti + persi cresce di almeno host_gap secondi nasce un evento
+      'host_gap' (es. byte mai arrivati, buffer del driver saturo), contato
+      a parte in lost_host perché è una stima dall'orologio e non dallo stream.
+    Ogni evento finisce nella gap map con indice campione, tempo e causa.
+    I byte mai arrivati non si vedono nello stream, per cui lost è un limite
+    inferiore; lost_host e host_deficit danno la stima complementare. La
+    deriva tra orologio del banco e dell'host accumula deficit lentamente:
+    su sessioni di ore può generare qualche evento 'host_gap' spurio.
+    """
+
+    def __init__(self, Tserial, learn_frames=16, max_events=10000, host_gap=0.2):
+        self.Tserial = Tserial
+        self.host_gap = host_gap
+        self.learn_frames = learn_frames
+        self.max_events = max_events
+        self.frame_samples = None       # campioni per frame appresi dagli header
+        self._learn = []
+        self.received = 0
+        self.lost = 0
+        self.lost_host = 0
+        self.events = []
+        self.events_dropped = 0
+        self.t_first = None
+        self.t_last = None
+        self._discarded_prev = 0
+        self._first_samples = 0
+        self._expected_prev = 0         # campioni attesi nei segmenti precedenti (vedi reset)
+
+    def reset(self, parser=None):
+        """Nuovo segmento di lettura (es. power on con un nuovo FrameParser)
+
+        I contatori della sessione restano; si riallineano i byte scartati al
+        nuovo parser e l'orologio dell'host riparte, così la pausa tra i due
+        segmenti non conta come campioni mancanti.
+        """
+        self._expected_prev = self.expected_host
+        self._discarded_prev = parser.bytes_discarded if parser is not None else 0
+        self.t_first = None
+        self.t_last = None
+        self._first_samples = 0
+
+    def update(self, parser, t_host=None):
+        """Da chiamare dopo ogni FrameParser.read/feed"""
+        if t_host is None:
+            t_host = time.time()
+        sizes = parser.last_frame_sizes
+        discarded = parser.bytes_discarded - self._discarded_prev
+        self._discarded_prev = parser.bytes_discarded
+        # I byte prima del primo header (sessione iniziata a metà frame) non sono una perdita
+        if discarded and self.t_first is not None:
+            self._add_event(t_host, self._discarded_samples(discarded), 'discarded')
+
+        if sizes and self.t_first is None:
+            self.t_first = t_host
+            self._first_samples = sum(sizes)      # generati prima di t_first
+        if self.t_first is not None:
+            self.t_last = t_host
+
+        for n in sizes:
+            if self.frame_samples is None:
+                self._learn.append(n)
+                if len(self._learn) >= self.learn_frames:
+                    self.frame_samples = max(set(self._learn), key=self._learn.count)
+            elif n < self.frame_samples:
+                self._add_event(t_host, self.frame_samples - n, 'short_frame')
+            self.received += n
+
+        if sizes:
+            deficit = self.expected_host - self.received - self.lost - self.lost_host
+            if deficit * self.Tserial >= self.host_gap:
+                self.lost_host += deficit
+                self._record(t_host, deficit, 'host_gap')
+
+    def _discarded_samples(self, nbytes):
+        if self.frame_samples is None:
+            return nbytes // FRAME_ALIGN
+        frame_bytes = self.frame_samples * FRAME_ALIGN
+        return -(-nbytes // frame_bytes) * self.frame_samples
+
+    def _add_event(self, t_host, lost, reason):
+        if lost <= 0:
+            return
+        self.lost += lost
+        self._record(t_host, lost, reason)
+
+    def _record(self, t_host, lost, reason):
+        if len(self.events) >= self.max_events:
+            self.events_dropped += 1
+            return
+        self.events.append({
+            'sample': self.received,
+            't_host': t_host,
+            't_session': t_host - self.t_first if self.t_first is not None else 0.0,
+            'lost': int(lost),
+            'reason': reason,
+        })
+
+    @property
+    def expected_host(self):
+        """Campioni attesi secondo l'orologio dell'host"""
+        if self.t_first is None:
+            return self._expected_prev
+        return (self._expected_prev + self._first_samples
+                + int((self.t_last - self.t_first) / self.Tserial))
+
+    def summary(self):
+        total = self.received + self.lost
+        return {
+            'Tserial': self.Tserial,
+            'frame_samples': self.frame_samples,
+            'received': self.received,
+            'lost': self.lost,
+            'loss_pct': 100 * self.lost / total if total else 0.0,
+            'lost_host': self.lost_host,
+            'expected_host': self.expected_host,
+            'host_deficit': max(self.expected_host - total, 0),
+            'gap_events': len(self.events) + self.events_dropped,
+        }
+
+    def status_text(self):
+        s = self.summary()
+        text = f"persi {s['lost']} ({s['loss_pct']:.3f}%, {s['gap_events']} gap)"
+        if s['lost_host']:
+            text += f", ~{s['lost_host']} dall'orologio"
+        return text
+
+    def to_dict(self):
+        return {'summary': self.summary(), 'events': self.events}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,190 @@
+import math
+import time
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+
+class _Tier:
+    """Livello decimato: ogni intervallo riassume factor ingressi con min/max/media"""
+
+    def __init__(self, factor, length, n_channels, samples_per_bin):
+        self.factor = factor
+        self.samples_per_bin = samples_per_bin      # campioni a piena risoluzione per intervallo
+        C = n_channels
+        self.C = C
+        self.bins = RingBuffer(length, n_channels=3 * C, dtype=np.float32)   # min..., max..., media...
+        self._pmin = np.empty(C)
+        self._pmax = np.empty(C)
+        self._psum = np.zeros(C)
+        self._n = 0
+
+    def push(self, mn, mx, mean):
+        """Aggrega gli ingressi; restituisce gli intervalli completati (min, max, media) o None"""
+        f, C = self.factor, self.C
+        done = []
+        if self._n:
+            k = min(f - self._n, len(mn))
+            if k:
+                np.minimum(self._pmin, mn[:k].min(axis=0), out=self._pmin)
+                np.maximum(self._pmax, mx[:k].max(axis=0), out=self._pmax)
+                self._psum += mean[:k].sum(axis=0)
+                self._n += k
+                mn, mx, mean = mn[k:], mx[k:], mean[k:]
+            if self._n < f:
+                return None
+            done.append(np.concatenate([self._pmin, self._pmax, self._psum / f]).reshape(1, 3 * C))
+            self._n = 0
+
+        n_full = len(mn) // f
+        if n_full:
+            end = n_full * f
+            done.append(np.concatenate([mn[:end].reshape(-1, f, C).min(axis=1),
+                                        mx[:end].reshape(-1, f, C).max(axis=1),
+                                        mean[:end].reshape(-1, f, C).mean(axis=1)], axis=1))
+        rest = len(mn) - n_full * f
+        if rest:
+            self._pmin[:] = mn[n_full * f:].min(axis=0)
+            self._pmax[:] = mx[n_full * f:].max(axis=0)
+            self._psum[:] = mean[n_full * f:].sum(axis=0)
+            self._n = rest
+
+        if not done:
+            return None
+        out = done[0] if len(done) == 1 else np.concatenate(done)
+        self.bins.append(out)
+        return out[:, :C], out[:, C:2 * C], out[:, 2 * C:]
+
+
+class TieredHistory:
+    """Storico multi-risoluzione dell'intera sessione a memoria limitata
+
+    Il livello 0 tiene gli ultimi full_seconds a piena risoluzione; ogni
+    livello successivo riassume factor intervalli del precedente con min,
+    max e media, per n_tiers livelli da tier_length intervalli ciascuno
+    (float32). Con i valori di default a Tserial = 0.5 ms: 60 s a piena
+    risoluzione, poi intervalli da 5 ms (5 min), 50 ms (50 min) e 0.5 s
+    (8.3 h), circa 19 MB in tutto; oltre, i dati più vecchi si perdono.
+
+    query() sceglie il livello più fine che copre l'intervallo richiesto con
+    al più factor * max_points intervalli e li riduce in blocco a max_points,
+    quindi il costo di una vista dipende dai pixel e non dalla durata. Come
+    RingBuffer, append() e query() possono stare su thread diversi (seqlock).
+    """
+
+    def __init__(self, Tserial, n_channels=3, full_seconds=60, factor=10, n_tiers=3,
+                 tier_length=60000):
+        self.Tserial = Tserial
+        self.n_channels = int(n_channels)
+        self.factor = factor
+        self.full = RingBuffer(int(full_seconds / Tserial), n_channels=self.n_channels)
+        self.tiers = []
+        spb = 1
+        for _ in range(n_tiers):
+            spb *= factor
+            self.tiers.append(_Tier(factor, tier_length, self.n_channels, spb))
+        self.count = 0      # campioni della sessione
+        self.seq = 0
+
+    @property
+    def duration(self):
+        return self.count * self.Tserial
+
+    @property
+    def nbytes(self):
+        return self.full._buf.nbytes + sum(t.bins._buf.nbytes for t in self.tiers)
+
+    def append(self, data):
+        data = np.asarray(data, dtype=np.float64).reshape(-1, self.n_channels)
+        if not len(data):
+            return
+        self.seq += 1
+        try:
+            self.full.append(data)
+            self.count += len(data)
+            levels = (data, data, data)
+            for tier in self.tiers:
+                levels = tier.push(*levels)
+                if levels is None:
+                    break
+        finally:
+            self.seq += 1
+
+    def clear(self):
+        self.seq += 1
+        self.full.clear()
+        for tier in self.tiers:
+            tier.bins.clear()
+            tier._n = 0
+        self.count = 0
+        self.seq += 1
+
+    def _levels(self):
+        """(campioni per intervallo, buffer, intervalli totali) dal più fine al più grossolano"""
+        yield 1, self.full, self.count
+        for tier in self.tiers:
+            yield tier.samples_per_bin, tier.bins, tier.bins.count
+
+    def query(self, t0, t1, max_points=2000):
+        """Dati tra t0 e t1 [s di sessione] al livello più fine con al più max_points intervalli
+
+        Restituisce dict con t (inizio intervallo), min, max, mean (n, n_channels)
+        e dt (durata di un intervallo).
+        """
+        while True:
+            seq = self.seq
+            if not seq & 1:
+                out = self._query(t0, t1, max_points)
+                if self.seq == seq:
+                    return out
+            time.sleep(0)
+
+    def _query(self, t0, t1, max_points):
+        C = self.n_channels
+        s0 = max(int(t0 / self.Tserial), 0)
+        s1 = min(int(math.ceil(t1 / self.Tserial)), self.count)
+        chosen = None
+        for spb, buf, n_bins in self._levels():
+            first = max(n_bins - buf.length, 0) * spb      # primo campione ancora disponibile
+            b0, b1 = max(s0, first) // spb, min(s1 // spb, n_bins)
+            if b1 <= b0:
+                continue
+            chosen = (spb, buf, n_bins, b0, b1)
+            if first <= s0 and b1 - b0 <= max_points * self.factor:
+                break
+        if chosen is None:
+            empty = np.empty((0, C))
+            return {'t': np.empty(0), 'min': empty, 'max': empty, 'mean': empty, 'dt': self.Tserial}
+
+        spb, buf, n_bins, b0, b1 = chosen
+        # Nella finestra ordinata del buffer l'ultima riga è l'intervallo n_bins - 1
+        offset = buf.length - n_bins
+        rows = np.array(buf.view()[offset + b0:offset + b1])
+        if spb == 1:
+            mn = mx = mean = rows
+        else:
+            mn, mx, mean = rows[:, :C], rows[:, C:2 * C], rows[:, 2 * C:]
+
+        # Riduzione in blocco a max_points; scarto il resto all'inizio per tenere i dati recenti
+        r = -(-len(rows) // max_points)
+        if r > 1:
+            n = len(rows) // r * r
+            skip = len(rows) - n
+            b0 += skip
+            mn = mn[skip:].reshape(-1, r, C).min(axis=1)
+            mx = mx[skip:].reshape(-1, r, C).max(axis=1)
+            mean = mean[skip:].reshape(-1, r, C).mean(axis=1)
+        dt = spb * max(r, 1) * self.Tserial
+        t = b0 * spb * self.Tserial + np.arange(len(mn)) * dt
+        return {'t': t, 'min': mn, 'max': mx, 'mean': mean, 'dt': dt}
+
+    def envelope(self, t0, t1, max_points=2000):
+        """(x [s da t0], y (2n, n_channels)) con min e max alternati, per il renderer"""
+        q = self.query(t0, t1, max_points)
+        n = len(q['t'])
+        x = np.repeat(q['t'] - t0, 2)
+        y = np.empty((2 * n, self.n_channels))
+        y[0::2] = q['min']
+        y[1::2] = q['max']
+        return x, y
@@ -0,0 +1,203 @@
+"""Trasporto asyncio per il protocollo del banco NVH
+
+RigConnection legge e decodifica lo stream di un banco dentro un event loop
+asyncio (nessun thread dedicato per porta su POSIX: loop.add_reader sul file
+descriptor della seriale; per porte senza fileno, es. simulatore o replay,
+le letture passano dall'executor di default). I comandi passano dalla
+connessione: write() per l'invio immediato (stessa interfaccia di una
+porta, es. per CommandQueue), send() per attendere come conferma la
+transizione del canale di stato st verso uno degli stati attesi.
+
+TkAsyncioBridge fa girare l'event loop dentro il mainloop di Tk, così
+acquisizione, comandi e GUI condividono un solo thread.
+"""
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from nvh_commands import CommandFrame, encode_many
+from serial_decoder import FrameParser
+
+
+class RigConnection:
+    """Connessione asincrona a un banco"""
+
+    def __init__(self, port, chunk_bytes=12012, max_queue=256, Tserial=None):
+        self.port = port
+        self.Tserial = Tserial          # se noto, i campioni precedenti al comando non lo confermano
+        self.parser = FrameParser(chunk_bytes)
+        self.chunk_bytes = chunk_bytes
+        self.state = np.nan             # ultimo valore del canale st
+        self.blocks_dropped = 0
+        self.gaps = None                # GapTracker opzionale, aggiornato a ogni lettura
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._waiters = []              # (stati attesi, future, t invio)
+        self._task = None
+        self._fd = None
+        self._closed = False
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        fileno = getattr(self.port, 'fileno', None)
+        if os.name == 'posix' and fileno is not None:
+            # Letture non bloccanti guidate dal loop
+            self.port.timeout = 0
+            self._fd = fileno()
+            loop.add_reader(self._fd, self._on_readable)
+        else:
+            self._task = loop.create_task(self._executor_reader())
+
+    def _on_readable(self):
+        try:
+            n = max(1, min(self.port.in_waiting, self.chunk_bytes))
+            self._on_block(self.parser.read(self.port, n))
+        except Exception as e:
+            print(f"Errore lettura seriale: {e}")
+            self.close()
+
+    async def _executor_reader(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while not self._closed and self.port.is_open:
+                data = await loop.run_in_executor(None, self.parser.read, self.port)
+                self._on_block(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Errore lettura seriale: {e}")
+        self.close()
+
+    def _on_block(self, data):
+        if self.gaps is not None:
+            self.gaps.update(self.parser)
+        if data is None:
+            return
+        block = data.copy()     # la vista del parser viene riusata alla lettura successiva
+        st = np.rint(block[:, 2])
+        prev_state, self.state = self.state, st[-1]
+        if self._waiters:
+            now = time.perf_counter()
+            prev = np.empty_like(st)
+            prev[0] = prev_state
+            prev[1:] = st[:-1]
+            if self.Tserial:
+                t_samples = now - np.arange(len(st) - 1, -1, -1) * self.Tserial
+            else:
+                t_samples = np.full(len(st), now)
+            for waiter in list(self._waiters):
+                states, fut, t0 = waiter
+                if fut.done():
+                    self._waiters.remove(waiter)
+                    continue
+                # Transizione: campione in uno stato atteso preceduto da uno fuori (e noto)
+                hit = np.flatnonzero(np.isin(st, states) & ~np.isin(prev, states)
+                                     & ~np.isnan(prev) & (t_samples >= t0))
+                if len(hit):
+                    fut.set_result(t_samples[hit[0]])
+                    self._waiters.remove(waiter)
+        try:
+            self._queue.put_nowait(block)
+        except asyncio.QueueFull:
+            self.blocks_dropped += 1
+
+    async def frames(self):
+        """Iteratore asincrono dei blocchi decodificati (N, 3): ref, meas, st"""
+        while True:
+            block = await self._queue.get()
+            if block is None:
+                return
+            yield block
+
+    async def send(self, frames, expect_states=None, timeout=2.0):
+        """Invia uno o più comandi (CommandFrame, lista di CommandFrame o byte) con una
+        write; con expect_states attende la transizione di st verso uno di quegli stati
+        e restituisce il tempo di risposta [s] (asyncio.TimeoutError se scade). Se st è
+        già in uno degli stati attesi non ci sarà transizione: restituisce None subito."""
+        if isinstance(frames, CommandFrame):
+            frames = [frames]
+        data = frames if isinstance(frames, (bytes, bytearray, memoryview)) else encode_many(frames)
+        fut = None
+        if expect_states is not None:
+            states = np.atleast_1d(expect_states)
+            if not np.isin(self.state, states):
+                fut = asyncio.get_running_loop().create_future()
+        t0 = time.perf_counter()
+        if fut is not None:
+            self._waiters.append((states, fut, t0))
+        self.write(data)
+        if fut is None:
+            return None
+        t_ack = await asyncio.wait_for(fut, timeout)
+        return max(t_ack - t0, 0.0)
+
+    def write(self, data):
+        """Invio senza attesa; dopo close() i comandi vanno scritti sulla porta"""
+        if self._closed:
+            raise OSError("connessione al banco chiusa")
+        return self.port.write(data)
+
+    @property
+    def is_open(self):
+        return not self._closed and self.port.is_open
+
+    def close(self, close_port=True):
+        """Ferma la lettura; con close_port=False la porta resta aperta (es. power off)"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._fd is not None:
+            asyncio.get_event_loop().remove_reader(self._fd)
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+        for _, fut in self._waiters:
+            fut.cancel()
+        self._waiters.clear()
+        # Sveglia eventuali consumatori di frames()
+        if not self._queue.full():
+            self._queue.put_nowait(None)
+        if close_port:
+            self.port.close()
+
+
+class TkAsyncioBridge:
+    """Esegue un event loop asyncio dentro il mainloop di Tk
+
+    Ogni interval_ms il loop processa le callback pronte e torna a Tk; le
+    coroutine si avviano con spawn() dal thread della GUI.
+    """
+
+    def __init__(self, root, interval_ms=5, loop=None):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.loop = loop or asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._running = True
+        self.root.after(self.interval_ms, self._pump)
+
+    def _pump(self):
+        if not self._running:
+            return
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.root.after(self.interval_ms, self._pump)
+
+    def spawn(self, coro):
+        return self.loop.create_task(coro)
+
+    def cancel(self, task):
+        """Cancella task e ne attende la fine (incluso il finally) dal thread della GUI"""
+        if task is None or task.done():
+            return
+        task.cancel()
+        # Il loop gira solo dentro _pump, quindi qui è fermo e si può eseguire fino alla fine del task
+        self.loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+
+    def close(self):
+        self._running = False
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.loop.close()
@@ -0,0 +1,181 @@
+"""Codifica dei comandi verso il banco NVH
+
+Un comando è un frame di 15 float32 little-endian (stesso ordine di
+serialTest_slow.m):
+    msghead, pos_init_mm, amplitude_mm, vcar_kmh, freq_Hz, rate_Hz_s,
+    numz[0]*1000, numz[2]*1000, denz[1], denz[2], denz[3], denz[4],
+    fend_Hz, aend_mm, 0
+msghead contiene i bit wv_type, pow_en, pos_en, test_start, test_stop
+(1 bit ciascuno), test_sel e Gr_sel (2 bit ciascuno), dal più significativo.
+"""
+import struct
+from dataclasses import asdict, dataclass, replace
+
+CMD_STRUCT = struct.Struct('<15f')
+CMD_LEN = CMD_STRUCT.size
+
+# Campi dell'header: (nome, shift, numero di bit)
+HEADER_FIELDS = (
+    ('wv_type', 8, 1),
+    ('pow_en', 7, 1),
+    ('pos_en', 6, 1),
+    ('test_start', 5, 1),
+    ('test_stop', 4, 1),
+    ('test_sel', 2, 2),
+    ('Gr_sel', 0, 2),
+)
+
+# Selezione test (test_sel)
+TEST_SINE = 0
+TEST_SWEEP = 1
+TEST_QC = 2
+TEST_RENAULT = 3
+
+# Stati del firmware sul canale st (vedi serialTest_slow.m)
+ST_ERROR = -2
+ST_READY = -1
+ST_POWER = 0
+ST_POSITIONING = 1
+ST_TESTING = 2      # + test_sel: 2 Sine, 3 Sweep, 4 QC, 5 Renault
+
+
+@dataclass
+class CommandFrame:
+    """Comando da 15 float32 con i campi dell'header tipizzati"""
+    wv_type: int = 0            # 0 sinusoide, 1 triangolare
+    pow_en: int = 0
+    pos_en: int = 0
+    test_start: int = 0
+    test_stop: int = 0
+    test_sel: int = 0           # TEST_SINE, TEST_SWEEP, TEST_QC, TEST_RENAULT
+    Gr_sel: int = 0             # profilo strada ISO (0 A; 1 B; 2 C; 3 D)
+    pos_init_mm: float = 0.0
+    amplitude_mm: float = 0.0
+    vcar_kmh: float = 0.0
+    freq_Hz: float = 0.0
+    rate_Hz_s: float = 0.0
+    numz: tuple = (0.0, 0.0, 0.0, 0.0, 0.0)
+    denz: tuple = (1.0, 0.0, 0.0, 0.0, 0.0)
+    fend_Hz: float = 0.0
+    aend_mm: float = 0.0
+
+    @property
+    def header(self):
+        h = 0
+        for name, shift, bits in HEADER_FIELDS:
+            value = int(getattr(self, name))
+            if not 0 <= value < (1 << bits):
+                raise ValueError(f"{name}={value} fuori range ({bits} bit)")
+            h |= value << shift
+        return h
+
+    def values(self):
+        """I 15 valori nell'ordine del frame"""
+        numz, denz = self.numz, self.denz
+        return (self.header, self.pos_init_mm, self.amplitude_mm, self.vcar_kmh,
+                self.freq_Hz, self.rate_Hz_s, numz[0] * 1000, numz[2] * 1000,
+                denz[1], denz[2], denz[3], denz[4], self.fend_Hz, self.aend_mm, 0.0)
+
+    @property
+    def kind(self):
+        """Tipo di comando, per statistiche e log"""
+        if not self.pow_en:
+            return 'power_off'
+        if self.test_stop:
+            return 'stop'
+        if self.test_start:
+            return 'test'
+        if self.pos_en:
+            return 'positioning'
+        return 'power_on'
+
+    def expected_state(self):
+        """Stato st in cui il firmware entra dopo questo comando"""
+        return {
+            'power_off': ST_READY,
+            'stop': ST_POSITIONING,
+            'test': ST_TESTING + self.test_sel,
+            'positioning': ST_POSITIONING,
+            'power_on': ST_POWER,
+        }[self.kind]
+
+    def pack(self):
+        return CMD_STRUCT.pack(*self.values())
+
+    def pack_into(self, buffer, offset=0):
+        CMD_STRUCT.pack_into(buffer, offset, *self.values())
+
+    def replace(self, **changes):
+        return replace(self, **changes)
+
+    def as_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def unpack(cls, frame):
+        """Decodifica un frame da 60 byte (numz/denz ricostruiti come nel firmware)"""
+        f = CMD_STRUCT.unpack(frame)
+        h = int(f[0])
+        bits = {name: (h >> shift) & ((1 << n) - 1) for name, shift, n in HEADER_FIELDS}
+        return cls(**bits,
+                   pos_init_mm=f[1], amplitude_mm=f[2], vcar_kmh=f[3], freq_Hz=f[4],
+                   rate_Hz_s=f[5],
+                   numz=(f[6] / 1000, 0.0, f[7] / 1000, 0.0, f[6] / 1000),
+                   denz=(1.0, f[8], f[9], f[10], f[11]),
+                   fend_Hz=f[12], aend_mm=f[13])
+
+
+def encode(frame):
+    return frame.pack()
+
+
+def encode_many(frames):
+    """Codifica più comandi in un unico buffer contiguo"""
+    frames = list(frames)
+    out = bytearray(CMD_LEN * len(frames))
+    for i, frame in enumerate(frames):
+        frame.pack_into(out, i * CMD_LEN)
+    return bytes(out)
+
+
+class CommandQueue:
+    """Comandi accodati e inviati con una sola write
+
+    Più comandi consecutivi (es. power on + posizionamento) partono nello
+    stesso trasferimento, così il tempo di emissione non dipende da quante
+    write separate il sistema operativo deve schedulare.
+    """
+
+    def __init__(self, port=None):
+        self.port = port
+        self.pending = []
+        self.sent = 0
+        self.last_write = b''
+
+    def put(self, frame):
+        """Accoda un comando già codificato: un frame non valido solleva ValueError
+        qui e non entra in coda"""
+        self.pending.append(frame.pack())
+
+    def flush(self, port=None):
+        """Scrive tutti i comandi in attesa; restituisce il numero di comandi inviati
+
+        La coda viene svuotata prima della write: se la write fallisce i comandi
+        sono persi (l'eccezione arriva al chiamante) e non vengono reinviati,
+        fuori ordine, davanti al comando successivo.
+        """
+        if not self.pending:
+            return 0
+        port = port or self.port
+        frames, self.pending = self.pending, []
+        data = b''.join(frames)
+        port.write(data)
+        self.sent += len(frames)
+        self.last_write = data
+        return len(frames)
+
+    def send(self, *frames, port=None):
+        # Codifica di tutti i frame prima di accodarne uno: o partono tutti o nessuno
+        data = [frame.pack() for frame in frames]
+        self.pending.extend(data)
+        return self.flush(port)
@@ -0,0 +1,24 @@
+import serial
+
+
+def open_port(port_name, timeout=2, replay_speed=1.0):
+    """Apre la porta del banco
+
+    Oltre ai nomi di porta seriale (COM8, /dev/ttyUSB0, /dev/pts/3) accetta
+    'sim' per il simulatore in-process e 'replay:FILE' per rileggere una
+    cattura registrata con RawRecorder.
+    """
+    if port_name == 'sim':
+        from nvh_simulator import SimulatedSerial
+        return SimulatedSerial(timeout=timeout)
+    if port_name.startswith('replay:'):
+        from capture import ReplaySerial
+        return ReplaySerial(port_name[len('replay:'):], speed=replay_speed, timeout=timeout)
+    return serial.Serial(
+        port=port_name,
+        baudrate=12_000_000,
+        bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=timeout
+    )
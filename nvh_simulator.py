@@ -0,0 +1,291 @@
+"""Simulatore del banco NVH (sostituto di mod_firmware_NVH_v6 lato seriale)
+
+Genera lo stesso stream binario del firmware: header (17733, 21331) seguito
+da terne int16 Q(1,16,9) ref/meas/state, e interpreta i comandi da 15 float32
+inviati da start_test/send_power_command.
+
+Uso da riga di comando (Linux), espone una pty a cui collegare GUI o script:
+    python nvh_simulator.py --rate 2000 --frame 100
+    python NVHApp_V2.py --port /dev/pts/N
+    python serialTest_slow.py /dev/pts/N
+
+In-process si può usare SimulatedSerial al posto di serial.Serial.
+"""
+import argparse
+import os
+import select
+import threading
+import time
+
+import numpy as np
+
+from serial_decoder import HEADER, N_CH, Q_FRAC
+from nvh_commands import (CMD_LEN, CommandFrame, ST_ERROR, ST_READY, ST_POWER,
+                          ST_POSITIONING, ST_TESTING)
+
+
+def decode_command(frame):
+    """Decodifica un comando da 60 byte in un dizionario di campi"""
+    return CommandFrame.unpack(frame).as_dict()
+
+
+class RigSimulator:
+    """Modello del banco: macchina a stati, generazione riferimento e codifica frame"""
+
+    def __init__(self, Tserial=0.5e-3, samples_per_frame=100, tau=0.01, noise_mm=0.02, seed=None):
+        self.Tserial = Tserial
+        self.samples_per_frame = samples_per_frame
+        self.tau = tau
+        self.noise_mm = noise_mm
+        self.rng = np.random.default_rng(seed)
+
+        self.state = ST_READY
+        self.cmd = None
+        self.t_test = 0.0
+        self.phase = 0.0
+        self.ref = 0.0
+        self.meas = 0.0
+        self.rate_lim = 20.0    # mm/s in posizionamento
+        self.commands = 0
+        self._rx = bytearray()
+        self._header = np.array(HEADER, dtype='<u2')
+        self._lock = threading.Lock()
+
+    # Comandi
+    def feed_command_bytes(self, data):
+        """Accoda byte ricevuti dall'host e applica i comandi completi"""
+        with self._lock:
+            self._rx += data
+            while len(self._rx) >= CMD_LEN:
+                self.apply_command(decode_command(bytes(self._rx[:CMD_LEN])))
+                del self._rx[:CMD_LEN]
+
+    def apply_command(self, cmd):
+        self.commands += 1
+        self.cmd = cmd
+        if not cmd['pow_en']:
+            self.state = ST_READY
+        elif cmd['test_stop']:
+            self.state = ST_POSITIONING
+        elif cmd['test_start']:
+            self.state = ST_TESTING + cmd['test_sel']
+            self.t_test = 0.0
+            self.phase = 0.0
+        elif cmd['pos_en']:
+            self.state = ST_POSITIONING
+        else:
+            self.state = ST_POWER
+
+    # Generazione
+    def _reference(self, n):
+        """Riferimento di posizione [mm] per n campioni nello stato corrente"""
+        cmd = self.cmd
+        Ts = self.Tserial
+        if self.state < ST_POSITIONING or cmd is None:
+            return np.full(n, self.ref)
+        if self.state == ST_POSITIONING:
+            step = self.rate_lim * Ts * np.arange(1, n + 1)
+            delta = cmd['pos_init_mm'] - self.ref
+            return self.ref + np.sign(delta) * np.minimum(step, abs(delta))
+
+        t = self.t_test + Ts * np.arange(n)
+        pos0 = cmd['pos_init_mm']
+        if self.state == ST_TESTING:                    # Sine / triangolare
+            ph = self.phase + 2 * np.pi * cmd['freq_Hz'] * Ts * np.arange(n)
+            if cmd['wv_type']:
+                wave = 2 / np.pi * np.arcsin(np.sin(ph))
+            else:
+                wave = np.sin(ph)
+            self.phase = ph[-1] + 2 * np.pi * cmd['freq_Hz'] * Ts
+            return pos0 + cmd['amplitude_mm'] * wave
+        if self.state == ST_TESTING + 1:                # Sweep
+            f = np.minimum(cmd['freq_Hz'] + cmd['rate_Hz_s'] * t, cmd['fend_Hz'])
+            ph = self.phase + 2 * np.pi * np.cumsum(f) * Ts
+            self.phase = ph[-1]
+            return pos0 + cmd['amplitude_mm'] * np.sin(ph)
+        if self.state == ST_TESTING + 2:                # Quarter car su strada casuale
+            level = 2.0 ** cmd['Gr_sel']
+            return pos0 + level * np.cumsum(self.rng.standard_normal(n)) * 0.01
+        # Renault: profilo periodico di sostituzione
+        return pos0 + 5 * np.sin(2 * np.pi * 0.5 * t) + 2 * np.sin(2 * np.pi * 3.1 * t)
+
+    def generate(self, n):
+        """Restituisce i byte di n campioni (raggruppati in frame con header)"""
+        # Import al primo uso: 'sim' non deve portare scipy nell'avvio dell'app
+        from scipy.signal import lfilter
+        with self._lock:
+            ref = self._reference(n)
+            if self.state >= ST_TESTING:
+                self.t_test += n * self.Tserial
+
+            # Misura: primo ordine sul riferimento + rumore
+            a = np.exp(-self.Tserial / self.tau)
+            meas, _ = lfilter([1 - a], [1, -a], ref, zi=[a * self.meas])
+            self.meas = meas[-1]
+            self.ref = ref[-1]
+            meas = meas + self.noise_mm * self.rng.standard_normal(n)
+
+            data = np.empty((n, N_CH))
+            data[:, 0] = ref
+            data[:, 1] = meas
+            data[:, 2] = self.state
+            q = np.clip(np.round(data * 2**Q_FRAC), -32768, 32767).astype('<i2')
+
+        # Un header ogni samples_per_frame campioni
+        spf = self.samples_per_frame
+        chunks = []
+        for i in range(0, n, spf):
+            chunks.append(self._header.tobytes())
+            chunks.append(q[i:i + spf].tobytes())
+        return b''.join(chunks)
+
+    def bytes_per_second(self, rate):
+        return rate * (2 * N_CH + 4 / self.samples_per_frame)
+
+
+class _Pacer(threading.Thread):
+    """Thread che genera campioni a rate fisso e li passa a sink(bytes)"""
+
+    def __init__(self, sim, sink, rate, baudrate, tick=0.005):
+        super().__init__(daemon=True)
+        max_rate = baudrate / 10 / sim.bytes_per_second(1)
+        if rate > max_rate:
+            print(f"Rate {rate:.0f} campioni/s oltre {baudrate} baud, limitato a {max_rate:.0f}")
+            rate = max_rate
+        self.sim = sim
+        self.sink = sink
+        self.rate = rate
+        self.tick = tick
+        self.running = True
+
+    def run(self):
+        spf = self.sim.samples_per_frame
+        t0 = time.perf_counter()
+        sent = 0
+        while self.running:
+            due = int((time.perf_counter() - t0) * self.rate)
+            n = ((due - sent) // spf) * spf
+            if n > 0:
+                self.sink(self.sim.generate(n))
+                sent += n
+            time.sleep(self.tick)
+
+
+class SimulatedSerial:
+    """Porta seriale in-process con la stessa interfaccia usata da serial.Serial"""
+
+    def __init__(self, sim=None, rate=2000, baudrate=12_000_000, timeout=2, max_buffer=1 << 24):
+        self.sim = sim or RigSimulator()
+        self.port = 'sim://nvh'
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.max_buffer = max_buffer
+        self.overflows = 0
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+        self.is_open = True
+        self._pacer = _Pacer(self.sim, self._push, rate, baudrate)
+        self._pacer.start()
+
+    def _push(self, data):
+        with self._cond:
+            if len(self._buf) + len(data) > self.max_buffer:
+                # Come il buffer del driver: i byte in eccesso vanno persi
+                self.overflows += 1
+                return
+            self._buf += data
+            self._cond.notify_all()
+
+    @property
+    def in_waiting(self):
+        return len(self._buf)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while len(self._buf) < size and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            data = bytes(self._buf[:size])
+            del self._buf[:size]
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def write(self, data):
+        self.sim.feed_command_bytes(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._buf.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self._pacer.running = False
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+
+def run_pty(sim, rate, baudrate):
+    """Espone il simulatore su una pseudo-terminale (solo POSIX)"""
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    print(f"Simulatore NVH su {os.ttyname(slave)} ({rate:.0f} campioni/s, Ctrl-C per uscire)")
+
+    def sink(data):
+        view = memoryview(data)
+        while view:
+            n = os.write(master, view)
+            view = view[n:]
+
+    pacer = _Pacer(sim, sink, rate, baudrate)
+    pacer.start()
+    state = sim.state
+    try:
+        while True:
+            r, _, _ = select.select([master], [], [], 0.1)
+            if r:
+                sim.feed_command_bytes(os.read(master, 4096))
+            if sim.state != state:
+                state = sim.state
+                print(f"Comando #{sim.commands}: stato -> {state}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pacer.running = False
+        os.close(master)
+        os.close(slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulatore seriale del banco NVH")
+    parser.add_argument('--rate', type=float, default=2000, help="campioni/s inviati (default 2000 = 1/Tserial)")
+    parser.add_argument('--frame', type=int, default=100, help="campioni per frame tra due header")
+    parser.add_argument('--baud', type=int, default=12_000_000, help="baudrate massimo simulato")
+    args = parser.parse_args()
+
+    # Tserial resta quello del firmware: rate > 2000 fa scorrere il tempo simulato più veloce
+    sim = RigSimulator(samples_per_frame=args.frame)
+    run_pty(sim, args.rate, args.baud)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,92 @@
+import os
+
 import numpy as np
-import pandas as pd
-from scipy import signal
-import control as ctrl
 
-def params_NVH():
+from road_profile import CACHE_DIR, load_road_profile
+from tf_cache import TFCache
+
+# Quarter car di default
+QUARTER_CAR = {'ms': 400, 'mu': 40, 'ks': 20e3, 'ku': 200e3, 'cs': 5000}
+
+# Discretizzazioni con python-control già calcolate, anche tra un avvio e l'altro.
+# Tustin ha la forma chiusa (tustin_quarter_car) e non passa dalla cache: serve
+# solo per gli altri metodi di sample_system ('zoh', 'foh', 'matched', ...).
+TF_CACHE = TFCache(maxsize=128, path=os.path.join(CACHE_DIR, 'quarter_car_tf.json'))
+
+
+def quarter_car_tf(Tref, ms, mu, ks, ku, cs, method='tustin', cache=TF_CACHE):
+    """numz, denz del quarter car discretizzato a Tref
+
+    Tustin in forma chiusa; gli altri metodi passano da python-control e sono
+    memoizzati in cache (None per ricalcolare).
+    """
+    if method == 'tustin':
+        # Forma chiusa: microsecondi, la cache non serve
+        return tustin_quarter_car(Tref, ms, mu, ks, ku, cs)
+    if cache is None:
+        return sample_quarter_car(Tref, ms, mu, ks, ku, cs, method)
+    key = TFCache.key(ms, mu, ks, ku, cs, Tref, method=method)
+    return cache.get_or_compute(key, lambda: sample_quarter_car(Tref, ms, mu, ks, ku, cs, method))
+
+
+# Riga i: coefficienti (potenze decrescenti di z) di (z-1)^i (z+1)^(4-i)
+_TUSTIN_BASIS = np.array([np.polymul(np.poly([1] * i), np.poly([-1] * (4 - i))) for i in range(5)])
+# (z-1)^2 (z+1)^2 = z^4 - 2 z^2 + 1
+_TUSTIN_NUM = np.array([1.0, 0.0, -2.0, 0.0, 1.0])
+
+
+def tustin_quarter_car(Tref, ms, mu, ks, ku, cs):
+    """Tustin in forma chiusa del quarter car, vettorizzato sui parametri
+
+    Con s = K (z-1)/(z+1), K = 2/Tref, e moltiplicando per (z+1)^4:
+        den = sum_i a_i K^i (z-1)^i (z+1)^(4-i)
+        num = -ku ms K^2 (z-1)^2 (z+1)^2
+    con a_i i coefficienti di s^i del denominatore di Gs; entrambi divisi
+    per den[0]. I parametri possono essere array (broadcast): il risultato
+    ha forma (..., 5), una riga di numz/denz per variante.
+    """
+    Tref, ms, mu, ks, ku, cs = np.broadcast_arrays(*(np.asarray(p, dtype=float)
+                                                      for p in (Tref, ms, mu, ks, ku, cs)))
+    K = 2.0 / Tref
+    # a_0 ... a_4, poi moltiplicati per K^i
+    a = np.stack([ks * ku,
+                  ku * cs * K,
+                  (ku * ms + ks * (ms + mu)) * K**2,
+                  cs * (ms + mu) * K**3,
+                  ms * mu * K**4], axis=-1)
+    den = a @ _TUSTIN_BASIS
+    num = (-ku * ms * K**2)[..., None] * _TUSTIN_NUM
+    d0 = den[..., :1]
+    return num / d0 + 0.0, den / d0       # + 0.0: niente -0.0 nei coefficienti nulli
+
+
+def sample_quarter_car(Tref, ms, mu, ks, ku, cs, method='tustin'):
+    """Discretizzazione con python-control, senza cache"""
+    # python-control viene caricato solo quando serve il modello
+    import control as ctrl
+
+    # Variabile s
+    s = ctrl.TransferFunction.s
+
+    # Funzione di trasferimento continua
+    Gs = -s**2*(ku*ms) / ( s**4*ms*mu
+                            + s**3*cs*(ms+mu)
+                            + s**2*(ku*ms + ks*(ms+mu))
+                            + s*ku*cs
+                            + ks*ku )
+
+    # Discretizzazione con Tustin
+    Gz = ctrl.sample_system(Gs, Tref, method=method)
+
+    # Estrazione numerator & denominator
+    numz = np.squeeze(Gz.num[0][0])
+    denz = np.squeeze(Gz.den[0][0])
+    return numz, denz
+
+
+def params_NVH(quarter_car=True):
+    """Parametri del banco; con quarter_car=False numz/denz non vengono calcolati
+    (vedi quarter_car_tf con i parametri in 'quarter_car')"""
     # Target parameters
     fpwm = 20e3
     Tpwm = 1 / fpwm
@@ -30,37 +113,11 @@ def params_NVH():
     POS_gain = 75 / 3.3 * 3 / 4095
     POS_offset = (19.32 + 68.18) / 2
 
-    # Profile treatment
-    data = pd.read_excel('QV-500hz-mm.xlsx')
-    t = data.iloc[:, 0].values
-    q = data.iloc[:, 1].values
-
-    tint = np.arange(0, t[-1], 1 / 200)
-    qint = np.interp(tint, t, q)
+    # Profile treatment (Excel letto solo se manca la cache, vedi road_profile)
+    tint, qint = load_road_profile('QV-500hz-mm.xlsx', fs=200)
 
     # Quarter car model
-    ms = 400
-    mu = 40
-    ks = 20e3
-    ku = 200e3
-    cs = 5000
-
-    # Variabile s
-    s = ctrl.TransferFunction.s
-
-    # Funzione di trasferimento continua
-    Gs = -s**2*(ku*ms) / ( s**4*ms*mu
-                            + s**3*cs*(ms+mu)
-                            + s**2*(ku*ms + ks*(ms+mu))
-                            + s*ku*cs
-                            + ks*ku )
-
-    # Discretizzazione con Tustin
-    Gz = ctrl.sample_system(Gs, Tref, method='tustin')
-
-    # Estrazione numerator & denominator
-    numz = np.squeeze(Gz.num[0][0])
-    denz = np.squeeze(Gz.den[0][0])
+    qc = dict(QUARTER_CAR)
 
     # # Continuous transfer function
     # num = [-ku * ms, 0, 0, 0, 0]
@@ -83,7 +140,7 @@ def params_NVH():
     # print(f"numz = {numz} ")
     # print(f"denz = {denz} ")
 
-    return {
+    params = {
         'Ts': Ts,
         'Tper': Tper,
         'Tserial': Tserial,
@@ -98,6 +155,8 @@ def params_NVH():
         'POS_offset': POS_offset,
         'tint': tint,
         'qint': qint,
-        'numz': numz,
-        'denz': denz
+        'quarter_car': qc
     }
+    if quarter_car:
+        params['numz'], params['denz'] = quarter_car_tf(Tref, **qc)
+    return params
@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+
+class EnvelopeLOD:
+    """Inviluppo min/max per colonna di pixel tra buffer e linee del grafico
+
+    La finestra di window campioni è divisa in n_bins intervalli (uno per
+    pixel dell'asse); per ogni intervallo si tengono min e max di ogni
+    canale, così i picchi restano visibili anche decimando. append() è
+    incrementale: aggiorna min/max correnti dell'intervallo parziale e
+    riduce in blocco (reshape + min/max) i nuovi intervalli interi. Il
+    grafico riceve sempre 2 * n_bins punti, qualunque sia la durata della
+    finestra. Come RingBuffer, append() e envelope() possono stare su
+    thread diversi: envelope() riprova se una append è avvenuta durante la
+    lettura (seqlock).
+    """
+
+    def __init__(self, window, n_channels=3, n_bins=1000, Tserial=0.5e-3):
+        self.window = int(window)
+        self.n_channels = int(n_channels)
+        self.spb = max(1, -(-self.window // int(n_bins)))       # campioni per intervallo
+        self.n_bins = max(1, self.window // self.spb)
+        self.Tserial = Tserial
+        C = self.n_channels
+        self.bins = RingBuffer(self.n_bins, n_channels=2 * C)    # colonne: min..., max...
+        # Intervallo in corso: min/max correnti, senza conservare i campioni
+        self._pmin = np.empty(C)
+        self._pmax = np.empty(C)
+        self._n_partial = 0
+        self.seq = 0
+
+        # Uscite preallocate: punti min/max alternati per ogni intervallo
+        self._x = np.empty(2 * (self.n_bins + 1))
+        self._y = np.empty((2 * (self.n_bins + 1), C))
+
+    def append(self, data):
+        self.seq += 1
+        try:
+            self._append(np.asarray(data).reshape(-1, self.n_channels))
+        finally:
+            self.seq += 1
+
+    def _append(self, data):
+        spb, C = self.spb, self.n_channels
+
+        # Completa l'intervallo parziale
+        if self._n_partial:
+            k = min(spb - self._n_partial, len(data))
+            if k:
+                np.minimum(self._pmin, data[:k].min(axis=0), out=self._pmin)
+                np.maximum(self._pmax, data[:k].max(axis=0), out=self._pmax)
+                self._n_partial += k
+                data = data[k:]
+            if self._n_partial < spb:
+                return
+            self.bins.append(np.concatenate([self._pmin, self._pmax]).reshape(1, 2 * C))
+            self._n_partial = 0
+
+        # Intervalli interi in blocco
+        n_full = len(data) // spb
+        if n_full:
+            # Servono al massimo gli ultimi n_bins intervalli
+            first = max(0, n_full - self.n_bins)
+            blocks = data[first * spb:n_full * spb].reshape(-1, spb, C)
+            self.bins.append(np.concatenate([blocks.min(axis=1), blocks.max(axis=1)], axis=1))
+
+        rest = len(data) - n_full * spb
+        if rest:
+            tail = data[n_full * spb:]
+            self._pmin[:] = tail.min(axis=0)
+            self._pmax[:] = tail.max(axis=0)
+            self._n_partial = rest
+
+    def envelope(self):
+        """(x [s], y (2n, n_channels)): min e max alternati, l'ultimo punto a fine finestra"""
+        while True:
+            seq = self.seq
+            if not seq & 1:
+                out = self._envelope()
+                if self.seq == seq:
+                    return out
+            time.sleep(0)
+
+    def _envelope(self):
+        C = self.n_channels
+        b = self.bins.view()
+        n = self.n_bins
+        y = self._y
+        y[0:2 * n:2] = b[:, :C]
+        y[1:2 * n:2] = b[:, C:]
+        if self._n_partial:
+            y[2 * n] = self._pmin
+            y[2 * n + 1] = self._pmax
+            n += 1
+        dt = self.spb * self.Tserial
+        xb = self.window * self.Tserial - (n - 1 - np.arange(n)) * dt
+        self._x[0:2 * n:2] = xb
+        self._x[1:2 * n:2] = xb
+        return self._x[:2 * n], y[:2 * n]
+
+    def reset(self, data=None):
+        """Svuota l'inviluppo; con data (finestra a piena risoluzione) lo ricostruisce"""
+        self.seq += 1
+        self.bins.clear()
+        self._n_partial = 0
+        self.seq += 1
+        if data is not None:
+            self.append(data)
@@ -0,0 +1,127 @@
+"""Renderer del grafico live di NVHApp
+
+DrawIdleRenderer è il percorso originale: set_data, limiti y ricalcolati a
+ogni blocco e canvas.draw_idle() (ridisegna assi, tick, griglia, legenda).
+
+BlitRenderer salva lo sfondo statico della figura e a ogni aggiornamento
+ridisegna solo le linee animate sopra lo sfondo (restore_region + blit).
+I limiti y dell'asse posizioni cambiano solo quando i dati escono dalla
+banda corrente o ne occupano meno di una frazione (isteresi); solo in quel
+caso si paga un ridisegno completo.
+"""
+import numpy as np
+
+
+def _auto_limits(lo, hi, pad_min=2.0, pad_frac=0.1):
+    pad = max(pad_min, pad_frac * (hi - lo))
+    return lo - pad, hi + pad
+
+
+class DrawIdleRenderer:
+    """Ridisegno completo a ogni aggiornamento (comportamento storico)"""
+
+    def __init__(self, canvas, ax_pos, lines_pos, line_state):
+        self.canvas = canvas
+        self.ax_pos = ax_pos
+        self.lines_pos = lines_pos
+        self.line_state = line_state
+        self.full_draws = 0
+        self.blits = 0
+
+    def update(self, t, data):
+        """data (N, 3): posizione target, rilevata, stato"""
+        for i, line in enumerate(self.lines_pos):
+            line.set_data(t, data[:, i])
+        self.line_state.set_data(t, data[:, 2])
+
+        pos = data[:, :2]
+        if np.any(pos != 0):
+            # Margine fisso di ±2 mm come nel codice originale
+            self.ax_pos.set_ylim(*_auto_limits(pos.min(), pos.max(), pad_frac=0))
+        self.canvas.draw_idle()
+        self.full_draws += 1
+
+    def redraw(self):
+        self.canvas.draw_idle()
+
+    def set_xlim(self, lo, hi):
+        for ax in {self.ax_pos, self.line_state.axes}:
+            ax.set_xlim(lo, hi)
+        self.redraw()
+
+
+class BlitRenderer:
+    """Aggiorna solo le linee sopra uno sfondo in cache"""
+
+    def __init__(self, canvas, ax_pos, lines_pos, line_state, shrink=0.4):
+        self.canvas = canvas
+        self.ax_pos = ax_pos
+        self.lines_pos = lines_pos
+        self.line_state = line_state
+        self.lines = list(lines_pos) + [line_state]
+        self.shrink = shrink        # zoom-in se i dati occupano meno di questa frazione dell'asse
+        self.full_draws = 0
+        self.blits = 0
+        self._bg = None
+        for line in self.lines:
+            line.set_animated(True)
+        self._cid = canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        # Ogni ridisegno completo (resize, zoom toolbar, nuovi limiti) aggiorna lo sfondo
+        fig = self.canvas.figure
+        self._bg = self.canvas.copy_from_bbox(fig.bbox)
+        self._draw_lines()
+        self.full_draws += 1
+
+    def _draw_lines(self):
+        fig = self.canvas.figure
+        for line in self.lines:
+            fig.draw_artist(line)
+
+    def _needs_rescale(self, lo, hi):
+        y0, y1 = self.ax_pos.get_ylim()
+        if lo < y0 or hi > y1:
+            return True
+        # Zoom-in solo se i nuovi limiti sono molto più stretti di quelli attuali
+        n0, n1 = _auto_limits(lo, hi)
+        return (n1 - n0) < self.shrink * (y1 - y0)
+
+    def update(self, t, data):
+        for i, line in enumerate(self.lines_pos):
+            line.set_data(t, data[:, i])
+        self.line_state.set_data(t, data[:, 2])
+
+        pos = data[:, :2]
+        lo, hi = pos.min(), pos.max()
+        if (lo != 0 or hi != 0) and self._needs_rescale(lo, hi):
+            self.ax_pos.set_ylim(*_auto_limits(lo, hi))
+            self.redraw()
+            return
+        if self._bg is None:
+            self.redraw()
+            return
+        self.canvas.restore_region(self._bg)
+        self._draw_lines()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self.blits += 1
+
+    def redraw(self):
+        """Ridisegno completo; lo sfondo viene ripreso in _on_draw"""
+        self.canvas.draw()
+
+    def set_xlim(self, lo, hi):
+        for ax in {self.ax_pos, self.line_state.axes}:
+            ax.set_xlim(lo, hi)
+        self.redraw()
+
+    def close(self):
+        self.canvas.mpl_disconnect(self._cid)
+        for line in self.lines:
+            line.set_animated(False)
+
+
+RENDERERS = {
+    'draw_idle': DrawIdleRenderer,
+    'blit': BlitRenderer,
+}
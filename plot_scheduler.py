@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class PlotScheduler:
+    """Limita i ridisegni del grafico live a un fps obiettivo
+
+    Il thread di lettura chiama request() a ogni blocco: imposta solo un
+    flag, senza toccare la coda eventi di Tk. Un tick periodico nel thread
+    della GUI ridisegna se il flag è attivo, quindi c'è al più un ridisegno
+    in attesa qualunque sia il numero di blocchi; le richieste assorbite da
+    un ridisegno già in attesa sono contate in skipped. Se il ridisegno
+    dura più del periodo il tick successivo parte subito, senza accumulare.
+    """
+
+    def __init__(self, root, draw, fps=30):
+        self.root = root
+        self.draw = draw
+        self.period = 1.0 / fps
+        self.requests = 0
+        self.skipped = 0
+        self.frames = 0
+        self.draw_time_last = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._running = False
+
+        self._prev_frames = 0
+        self._prev_t = time.perf_counter()
+        self.fps = 0.0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.root.after(0, self._tick)
+
+    def stop(self):
+        self._running = False
+
+    def request(self):
+        """Chiede un ridisegno; sicuro da qualsiasi thread"""
+        with self._lock:
+            self.requests += 1
+            if self._dirty:
+                self.skipped += 1
+            else:
+                self._dirty = True
+
+    def _tick(self):
+        if not self._running:
+            return
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = False
+        t0 = time.perf_counter()
+        if dirty:
+            self.draw()
+            self.frames += 1
+        self.draw_time_last = time.perf_counter() - t0
+        delay = max(1, int(1000 * (self.period - self.draw_time_last)))
+        self.root.after(delay, self._tick)
+
+    def measure_fps(self):
+        """fps effettivi dall'ultima chiamata"""
+        now = time.perf_counter()
+        dt = now - self._prev_t
+        if dt > 0:
+            self.fps = (self.frames - self._prev_frames) / dt
+        self._prev_t = now
+        self._prev_frames = self.frames
+        return self.fps
+
+    def status_text(self):
+        return f"plot {self.fps:.0f} fps, saltati {self.skipped}"
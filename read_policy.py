@@ -0,0 +1,41 @@
+import time
+
+
+class AdaptiveReadPolicy:
+    """Dimensionamento adattivo delle letture seriali
+
+    Ogni lettura chiede il massimo tra i byte già in attesa (in_waiting) e
+    quelli attesi entro il budget di latenza alla velocità stimata dello
+    stream, limitato a [min_chunk, max_chunk]. Con il timeout della porta
+    pari al budget, una lettura non attende mai più di max_latency: a basso
+    rate i blocchi sono piccoli e frequenti, durante un burst si svuota il
+    buffer del sistema operativo con letture grandi.
+    """
+
+    def __init__(self, max_latency=0.05, min_chunk=64, max_chunk=12012, byte_rate=12e3, alpha=0.2):
+        self.max_latency = max_latency
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.byte_rate = byte_rate      # stima [byte/s] dello stream
+        self.alpha = alpha
+        self.last_size = 0
+        self._t_last = time.perf_counter()
+
+    def apply(self, port):
+        """Imposta il timeout della porta al budget di latenza"""
+        port.timeout = self.max_latency
+
+    def next_size(self, in_waiting=0):
+        size = max(in_waiting, int(self.byte_rate * self.max_latency))
+        size = min(max(size, self.min_chunk), self.max_chunk)
+        self.last_size = size - size % 2
+        return self.last_size
+
+    def observe(self, nbytes):
+        """Aggiorna la stima del rate con i byte letti dall'ultima chiamata"""
+        now = time.perf_counter()
+        dt = now - self._t_last
+        self._t_last = now
+        if dt <= 0:
+            return
+        self.byte_rate += self.alpha * (nbytes / dt - self.byte_rate)
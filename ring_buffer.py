@@ -0,0 +1,104 @@
+import time
+
+import numpy as np
+
+
+class RingBuffer:
+    """Buffer circolare preallocato a finestra fissa
+
+    I campioni sono memorizzati due volte (storage di 2*length righe), così la
+    finestra ordinata dal più vecchio al più recente è sempre una fetta
+    contigua: view() non copia nulla e append() costa O(L) nei nuovi campioni,
+    indipendentemente dalla lunghezza della finestra.
+
+    view() è valida solo nel thread che scrive. Da altri thread (GUI,
+    analisi) si usa snapshot(): lo scrittore incrementa seq prima e dopo
+    ogni append (dispari = scrittura in corso), il lettore copia la
+    finestra e riprova se seq è cambiato (seqlock). Lo scrittore non si
+    blocca mai; il lettore ottiene tutti i canali allo stesso istante.
+    """
+
+    def __init__(self, length, n_channels=1, dtype=np.float64, storage=None):
+        self.length = int(length)
+        self.n_channels = int(n_channels)
+        if storage is None:
+            storage = np.zeros((2 * self.length, self.n_channels), dtype=dtype)
+        elif storage.shape != (2 * self.length, self.n_channels):
+            raise ValueError(f"storage deve avere forma {(2 * self.length, self.n_channels)}")
+        self._buf = storage
+        self.head = 0       # cursore di scrittura (= campione più vecchio)
+        self.count = 0      # campioni totali accodati
+        self.seq = 0        # contatore seqlock, dispari durante append()
+        self.snapshot_retries = 0
+
+    @property
+    def dtype(self):
+        return self._buf.dtype
+
+    def append(self, data):
+        """Accoda L campioni, data di forma (L, n_channels) oppure (L,) se mono-canale"""
+        data = np.asarray(data)
+        if data.ndim == 1:
+            data = data.reshape(-1, self.n_channels)
+        L = data.shape[0]
+        if L == 0:
+            return
+        self.seq += 1
+        try:
+            self._write(data, L)
+        finally:
+            self.seq += 1
+
+    def _write(self, data, L):
+        self.count += L
+
+        # Se arrivano più campioni della finestra tengo solo gli ultimi
+        if L >= self.length:
+            self._buf[:self.length] = data[-self.length:]
+            self._buf[self.length:] = data[-self.length:]
+            self.head = 0
+            return
+
+        N = self.length
+        n1 = min(L, N - self.head)
+        n2 = L - n1
+        self._buf[self.head:self.head + n1] = data[:n1]
+        self._buf[self.head + N:self.head + N + n1] = data[:n1]
+        if n2:
+            self._buf[:n2] = data[n1:]
+            self._buf[N:N + n2] = data[n1:]
+        self.head = (self.head + L) % N
+
+    def view(self):
+        """Finestra ordinata (length, n_channels) senza copia; valida fino al prossimo append"""
+        return self._buf[self.head:self.head + self.length]
+
+    def snapshot(self, out=None):
+        """Copia coerente della finestra ordinata: (array (length, n_channels), count)
+
+        Con out (stessa forma e dtype) la copia riusa quel buffer.
+        """
+        if out is None:
+            out = np.empty((self.length, self.n_channels), dtype=self.dtype)
+        while True:
+            seq = self.seq
+            if not seq & 1:
+                head = self.head
+                count = self.count
+                np.copyto(out, self._buf[head:head + self.length])
+                if self.seq == seq:
+                    return out, count
+            # Scrittura in corso o avvenuta durante la copia: cedo il GIL e riprovo
+            self.snapshot_retries += 1
+            time.sleep(0)
+
+    def channel(self, i):
+        """Vista ordinata del canale i"""
+        return self.view()[:, i]
+
+    def clear(self):
+        self.seq += 1
+        self._buf.fill(0)
+        self.head = 0
+        self.count = 0
+        self.seq += 1
@@ -0,0 +1,70 @@
+"""Profilo stradale ricampionato, con cache binaria
+
+Il profilo sorgente (Excel, colonne tempo [s] e quota [mm]) viene letto con
+pandas e interpolato a fs solo se manca la cache; il risultato è salvato in
+profile_cache/<nome>-<sha1>-<fs>Hz.npy (righe tint, qint, float64) accanto
+al file sorgente. La chiave contiene l'hash del contenuto e fs, quindi un
+profilo modificato o una frequenza diversa producono una nuova voce; le voci
+vecchie si possono cancellare a mano. Con la cache valida pandas non viene
+importato e il file è mappato in memoria (array in sola lettura).
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+CACHE_DIR = 'profile_cache'
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_path(path, fs, cache_dir=None, digest=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    if digest is None:
+        digest = file_hash(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest[:16]}-{fs:g}Hz.npy")
+
+
+def resample_profile(path, fs=200):
+    """Lettura dell'Excel e interpolazione a fs (percorso lento, senza cache)"""
+    import pandas as pd
+    data = pd.read_excel(path)
+    t = data.iloc[:, 0].values
+    q = data.iloc[:, 1].values
+
+    tint = np.arange(0, t[-1], 1 / fs)
+    qint = np.interp(tint, t, q)
+    return tint, qint
+
+
+def load_road_profile(path='QV-500hz-mm.xlsx', fs=200, cache_dir=None, mmap=True):
+    """(tint, qint) del profilo a fs [Hz], dalla cache se valida"""
+    cached = cache_path(path, fs, cache_dir)
+    if os.path.exists(cached):
+        try:
+            tq = np.load(cached, mmap_mode='r' if mmap else None)
+            return tq[0], tq[1]
+        except (OSError, ValueError) as e:
+            print(f"Cache profilo non valida ({cached}): {e}")
+
+    tint, qint = resample_profile(path, fs)
+    try:
+        folder = os.path.dirname(cached)
+        os.makedirs(folder, exist_ok=True)
+        # File temporaneo proprio + rename: nessuna cache a metà se si interrompe,
+        # e due avvii concorrenti non scrivono sullo stesso file
+        with tempfile.NamedTemporaryFile(dir=folder, suffix='.tmp', delete=False) as f:
+            np.save(f, np.vstack([tint, qint]))
+        os.replace(f.name, cached)
+    except OSError as e:
+        print(f"Impossibile salvare la cache del profilo: {e}")
+    return tint, qint
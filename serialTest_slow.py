@@ -1,16 +1,18 @@
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import serial.tools.list_ports
 import serial
-import struct
 import time
 import openpyxl
 from params_NVH import params_NVH
+from serial_decoder import FrameParser
+from ring_buffer import RingBuffer
+from nvh_ports import open_port
+from nvh_commands import CommandFrame
+from command_latency import CommandLatencyTracker
 
-def run_test():
-    # Import parameters
-    p = params_NVH()
-
+def select_port():
     # Mostra le porte disponibili e chiedi all'utente quale usare
     ports = list(serial.tools.list_ports.comports())
     print("Porte seriali disponibili:")
@@ -18,24 +20,26 @@ def run_test():
         print(f"{idx+1}: {port.device} ({port.description})")
     if not ports:
         print("Nessuna porta seriale trovata.")
-        return
+        return None
     selection = input("Seleziona il numero della porta a cui collegarti: ")
     try:
         port_idx = int(selection) - 1
-        port_name = ports[port_idx].device
+        return ports[port_idx].device
     except (ValueError, IndexError):
         print("Selezione non valida.")
-        return
+        return None
+
+def run_test(port_name=None, replay_speed=1.0):
+    # Import parameters
+    p = params_NVH()
+
+    if port_name is None:
+        port_name = select_port()
+        if port_name is None:
+            return
 
     # Serial setup
-    sp = serial.Serial(
-        port=port_name,
-        baudrate=12_000_000,
-        bytesize=serial.EIGHTBITS,
-        parity=serial.PARITY_NONE,
-        stopbits=serial.STOPBITS_ONE,
-        timeout=2
-    )
+    sp = open_port(port_name, timeout=2, replay_speed=replay_speed)
 
     if not sp.is_open:
         sp.open()
@@ -57,77 +61,49 @@ def run_test():
     aend_mm = 10        # Sweep final amplitude (0/20 mm)
 
     # Header message: 1 bit each except test_sel (2 bits) and Gr_sel (2 bits)
-    header_bits = f"{wv_type:01b}{pow_en:01b}{pos_en:01b}{test_start:01b}{test_stop:01b}" + \
-                  f"{test_sel:02b}{Gr_sel:02b}"
-    msghead = int(header_bits, 2)
-
-    # Construct message (same order as MATLAB)
-    msg = [
-        np.float32(msghead),
-        np.float32(pos_init_mm),
-        np.float32(amplitude_mm),
-        np.float32(vcar_kmh),
-        np.float32(freq_Hz),
-        np.float32(rate_Hz_s),
-        np.float32(p['numz'][0] * 1000),
-        np.float32(p['numz'][2] * 1000),  # numz[2] because in MATLAB is numz(3)
-        np.float32(p['denz'][1]),         # denz[2] in MATLAB
-        np.float32(p['denz'][2]),
-        np.float32(p['denz'][3]),
-        np.float32(p['denz'][4]),
-        np.float32(fend_Hz),
-        np.float32(aend_mm),
-        np.float32(0)
-    ]
+    # Message fields in the same order as MATLAB (see nvh_commands)
+    cmd = CommandFrame(wv_type=wv_type, pow_en=pow_en, pos_en=pos_en,
+                       test_start=test_start, test_stop=test_stop,
+                       test_sel=test_sel, Gr_sel=Gr_sel,
+                       pos_init_mm=pos_init_mm, amplitude_mm=amplitude_mm,
+                       vcar_kmh=vcar_kmh, freq_Hz=freq_Hz, rate_Hz_s=rate_Hz_s,
+                       numz=p['numz'], denz=p['denz'],
+                       fend_Hz=fend_Hz, aend_mm=aend_mm)
 
     # Pack and send message as float32
-    tx_bytes = b''.join(struct.pack('<f', val) for val in msg)
-    sp.write(tx_bytes)
+    Tserial = p['Tserial']
+    latency = CommandLatencyTracker(Tserial)
+    sp.write(cmd.pack())
+    latency.sent(cmd)
 
     # Receive and plot
-    Tserial = p['Tserial']
     Nd = int(0.5 * 6 * 1001)
     Ntot = int(10 / Tserial)
     time_vect = np.arange(Ntot) * Tserial
-    pos_ref = np.zeros(Ntot)
-    pos_meas = np.zeros(Ntot)
-    st = np.zeros(Ntot)
+    data_buffer = RingBuffer(Ntot, n_channels=3)  # pos_ref, pos_meas, st
+    parser = FrameParser(Nd * 2)
 
     try:
-        while True:
+        while sp.is_open:
             # Lettura dei dati seriali (2 byte per ogni uint16)
-            rawdata = sp.read(Nd * 2)
-            rawdata_uint16 = list(struct.unpack('<' + 'H' * (len(rawdata) // 2), rawdata))
-
-            # Trova gli header (17733, 21331)
-            header = [17733, 21331]
-            pos = [i for i in range(len(rawdata_uint16) - 1) if rawdata_uint16[i:i + 2] == header]
-            for idx in reversed(pos):
-                del rawdata_uint16[idx:idx + 2]  # Rimuovi header
-
-            if not pos:
-                raise Exception("No packet header found")
-
-            # Riallinea i dati a multipli di 3
-            istart = (pos[0] % 3)
-            rawdata_aligned = rawdata_uint16[istart:]
-            iend = (len(rawdata_aligned) // 3) * 3
-            rawdata_aligned = rawdata_aligned[:iend]
-
-            # Converti i dati in fixed-point signed (1,16,9) come in MATLAB
-            data = np.array(rawdata_aligned, dtype=np.uint16).reshape(-1, 3)
-            data_int16 = data.view(dtype=np.int16)  # Reinterpreta i bit come signed int16
-            scale = 2 ** 9  # 9 bit frazionari → numerictype(1,16,9)
-            data_float = data_int16.astype(np.float32) / scale
+            # Solo i campioni dei frame completi delimitati da header (17733, 21331)
+            data_float = parser.read(sp)
+
+            if parser.resyncing:
+                print(f"No packet header found, resync #{parser.resyncs}")
+            if data_float is None:
+                continue
+
+            if latency.last is None:
+                latency.observe(data_float[:, 2])
+                if latency.last:
+                    print(f"Command response: {latency.status_text()}")
 
             # Aggiorna i buffer circolari
-            L = len(data_float)
-            pos_ref = np.roll(pos_ref, -L)
-            pos_meas = np.roll(pos_meas, -L)
-            st = np.roll(st, -L)
-            pos_ref[-L:] = data_float[:, 0]
-            pos_meas[-L:] = data_float[:, 1]
-            st[-L:] = data_float[:, 2]  # ⚠️ CORRETTO ora, come in MATLAB!
+            data_buffer.append(data_float)
+            pos_ref = data_buffer.channel(0)
+            pos_meas = data_buffer.channel(1)
+            st = data_buffer.channel(2)
 
             # Plot
             plt.clf()
@@ -153,4 +129,6 @@ def run_test():
         print("Serial port closed.")
 
 if __name__ == "__main__":
-    run_test()
\ No newline at end of file
+    # Porta opzionale da riga di comando (es. /dev/pts/3 del simulatore, 'sim', 'replay:FILE [speed]')
+    run_test(sys.argv[1] if len(sys.argv) > 1 else None,
+             float(sys.argv[2]) if len(sys.argv) > 2 else 1.0)
\ No newline at end of file
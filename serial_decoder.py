@@ -0,0 +1,187 @@
+import time
+
+import numpy as np
+
+# Header di pacchetto inviato dal firmware (uint16 little-endian, "EESS")
+HEADER = (17733, 21331)
+N_CH = 3            # ref, meas, state
+Q_FRAC = 9          # numerictype(1,16,9)
+SCALE = 1 / 2**Q_FRAC
+
+HEADER_BYTES = np.array(HEADER, dtype='<u2').tobytes()   # b"EESS"
+FRAME_ALIGN = 2 * N_CH                                    # byte per campione
+
+
+class FrameParser:
+    """Parser incrementale dello stream seriale
+
+    Mantiene tra una lettura e l'altra i byte non ancora consumati ed emette
+    solo frame completi, cioè i campioni compresi tra due header consecutivi.
+    La ricerca dell'header è fatta a livello di byte, quindi il parser si
+    riaggancia anche dopo la perdita di un singolo byte. I byte scartati
+    (prima del primo header o in frame di lunghezza non multipla di 3
+    campioni) sono contati in bytes_discarded.
+
+    Se l'aggancio viene perso (nessun header nel buffer, frame troppo lungo
+    o di lunghezza errata) il parser entra in risincronizzazione e continua
+    a cercare in avanti il prossimo header, senza fermare chi lo chiama.
+    resyncs conta gli eventi, resync_latency_* misurano il tempo [s] tra la
+    perdita dell'aggancio e il primo frame valido successivo.
+    """
+
+    def __init__(self, chunk_bytes, max_frame_bytes=None):
+        self.chunk_bytes = int(chunk_bytes)
+        if max_frame_bytes is None:
+            max_frame_bytes = self.chunk_bytes
+        self.max_frame_bytes = int(max_frame_bytes) + len(HEADER_BYTES)
+        self.capacity = self.max_frame_bytes + self.chunk_bytes
+        self.rx = bytearray(self.capacity)
+        self._rx_view = memoryview(self.rx)
+        self._u8 = np.frombuffer(self.rx, dtype=np.uint8)
+        self._out = np.empty(self.capacity // 2, dtype=np.float32)
+        self.fill = 0           # byte validi in rx
+        self.synced = False     # rx inizia con un header
+        self.nread = 0
+        self.tap = None         # callable(memoryview) chiamato con ogni blocco letto (es. RawRecorder.record)
+        self.t_read = 0.0       # durata [s] di readinto (+ tap) nell'ultima read()
+        self.t_decode = 0.0     # durata [s] del parsing nell'ultima read()
+        self.last_frame_sizes = []  # campioni per frame emessi dall'ultima read()/feed()
+
+        # Statistiche
+        self.bytes_in = 0
+        self.bytes_discarded = 0
+        self.frames = 0
+        self.frames_bad = 0
+        self.resyncs = 0
+        self.resync_latency_last = 0.0
+        self.resync_latency_max = 0.0
+        self.resync_latency_total = 0.0
+        self._lost_t = None
+
+    def read(self, port, nbytes=None):
+        """Legge fino a nbytes da port direttamente nel buffer interno e li analizza"""
+        if nbytes is None:
+            nbytes = self.chunk_bytes
+        nbytes = min(nbytes, self.capacity - self.fill)
+        t0 = time.perf_counter()
+        self.nread = port.readinto(self._rx_view[self.fill:self.fill + nbytes]) or 0
+        if self.tap is not None and self.nread:
+            self.tap(self._rx_view[self.fill:self.fill + self.nread])
+        self.fill += self.nread
+        self.bytes_in += self.nread
+        t1 = time.perf_counter()
+        self.last_frame_sizes = []
+        data = self._parse()
+        self.t_read = t1 - t0
+        self.t_decode = time.perf_counter() - t1
+        return data
+
+    def feed(self, data):
+        """Analizza byte già letti (replay, test); restituisce i campioni dei frame completi"""
+        data = memoryview(data).cast('B')
+        self.last_frame_sizes = []
+        out = []
+        while len(data):
+            n = min(len(data), self.capacity - self.fill)
+            self.rx[self.fill:self.fill + n] = data[:n]
+            self.fill += n
+            self.bytes_in += n
+            data = data[n:]
+            samples = self._parse()
+            if samples is not None:
+                out.append(samples.copy())
+        if not out:
+            return None
+        return np.concatenate(out) if len(out) > 1 else out[0]
+
+    def reset(self):
+        self.fill = 0
+        self.synced = False
+        self._lost_t = None
+
+    @property
+    def resyncing(self):
+        return self._lost_t is not None
+
+    @property
+    def resync_latency_mean(self):
+        done = self.resyncs - (1 if self.resyncing else 0)
+        return self.resync_latency_total / done if done else 0.0
+
+    def _parse(self):
+        """Estrae i frame completi da rx[:fill]; restituisce una vista float32 (N, 3) o None"""
+        hlen = len(HEADER_BYTES)
+        pos = self.rx.find(HEADER_BYTES, 0, self.fill)
+        if pos < 0:
+            # Nessun header: tengo solo gli ultimi byte (possibile header spezzato)
+            keep = min(self.fill, hlen - 1)
+            self._discard(self.fill - keep)
+            self._lose_sync()
+            return None
+        if pos > 0:
+            self._discard(pos)
+            pos = 0
+        self.synced = True
+
+        k = 0
+        while True:
+            nxt = self.rx.find(HEADER_BYTES, pos + hlen, self.fill)
+            if nxt < 0:
+                break
+            payload = nxt - pos - hlen
+            if payload % FRAME_ALIGN == 0:
+                nwords = payload // 2
+                words = np.frombuffer(self.rx, dtype='<i2', count=nwords, offset=pos + hlen)
+                np.multiply(words, np.float32(SCALE), out=self._out[k:k + nwords])
+                k += nwords
+                self.frames += 1
+                self.last_frame_sizes.append(nwords // N_CH)
+                self._regain_sync()
+            else:
+                self.frames_bad += 1
+                self.bytes_discarded += payload
+                self._lose_sync()
+            pos = nxt
+
+        # Frame in corso troppo lungo: non potrà mai completarsi, lo scarto
+        if self.fill - pos > self.max_frame_bytes:
+            self.frames_bad += 1
+            self._discard_from(pos, self.fill - pos)
+            self._lose_sync()
+        elif pos > 0:
+            self._consume(pos)
+
+        if k == 0:
+            return None
+        return self._out[:k].reshape(-1, N_CH)
+
+    def _lose_sync(self):
+        self.synced = False
+        # L'attesa del primo header all'avvio non è una risincronizzazione
+        if self._lost_t is None and self.frames > 0:
+            self._lost_t = time.perf_counter()
+            self.resyncs += 1
+
+    def _regain_sync(self):
+        if self._lost_t is None:
+            return
+        dt = time.perf_counter() - self._lost_t
+        self._lost_t = None
+        self.resync_latency_last = dt
+        self.resync_latency_max = max(self.resync_latency_max, dt)
+        self.resync_latency_total += dt
+
+    def _consume(self, n):
+        """Sposta in testa a rx i byte dopo i primi n"""
+        rest = self.fill - n
+        if rest:
+            self._u8[:rest] = self._u8[n:self.fill]
+        self.fill = rest
+
+    def _discard(self, n):
+        self.bytes_discarded += n
+        self._consume(n)
+
+    def _discard_from(self, pos, n):
+        self.bytes_discarded += n
+        self._consume(pos + n)
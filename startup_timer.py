@@ -0,0 +1,39 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Tempi delle fasi di avvio dell'applicazione
+
+    t0 è l'istante di partenza (di default la creazione); step() misura una
+    fase, report() riassume tutte le fasi e il tempo totale da t0.
+    """
+
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.steps = []
+        self.last = 0.0
+        self.reported = False
+
+    @contextmanager
+    def step(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last = time.perf_counter() - t
+            self.steps.append((name, self.last))
+
+    def mark(self, name, since):
+        """Registra una fase misurata altrove (es. gli import prima di main)"""
+        self.last = time.perf_counter() - since
+        self.steps.append((name, self.last))
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def report(self, title="Avvio"):
+        self.reported = True
+        parts = [f"{name} {1000 * dt:.0f} ms" for name, dt in self.steps]
+        parts.append(f"totale {1000 * self.elapsed():.0f} ms")
+        return f"{title}: " + " | ".join(parts)
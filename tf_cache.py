@@ -0,0 +1,96 @@
+"""Cache delle funzioni di trasferimento discretizzate
+
+Chiave: parametri del modello + Tref + metodo di discretizzazione, valore:
+(numz, denz). La cache in memoria è un LRU limitato a maxsize voci; con
+path le voci sono anche salvate in un file JSON (scrittura atomica a ogni
+nuova voce e a clear()) e ricaricate al primo accesso, così anche un nuovo
+avvio le trova già calcolate. Più processi possono condividere il file:
+ognuno scrive su un proprio file temporaneo, vince l'ultimo os.replace.
+"""
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TFCache:
+    def __init__(self, maxsize=128, path=None):
+        self.maxsize = int(maxsize)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._loaded = path is None
+
+    @staticmethod
+    def key(*params, method='tustin'):
+        return tuple(float(p) for p in params) + (method,)
+
+    def get(self, key):
+        """(numz, denz) come nuovi array, o None se assente"""
+        self._load()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return np.array(entry[0]), np.array(entry[1])
+
+    def put(self, key, numz, denz):
+        self._load()
+        self._entries[key] = (tuple(map(float, numz)), tuple(map(float, denz)))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        if self.path:
+            self.save()
+
+    def get_or_compute(self, key, compute):
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        numz, denz = compute()
+        self.put(key, numz, denz)
+        return np.array(numz, dtype=float), np.array(denz, dtype=float)
+
+    def clear(self):
+        """Svuota la cache, anche su disco"""
+        self._loaded = True
+        self._entries.clear()
+        if self.path:
+            self.save()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                items = json.load(f)
+            for item in items[-self.maxsize:]:
+                self._entries[tuple(item['key'])] = (tuple(item['numz']), tuple(item['denz']))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Cache funzioni di trasferimento non valida ({self.path}): {e}")
+
+    def save(self):
+        # Dal meno al più recente, così al caricamento l'ordine LRU si conserva
+        items = [{'key': list(k), 'numz': list(v[0]), 'denz': list(v[1])}
+                 for k, v in self._entries.items()]
+        try:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=folder or '.', suffix='.tmp',
+                                             delete=False) as f:
+                json.dump(items, f)
+            os.replace(f.name, self.path)
+        except OSError as e:
+            print(f"Impossibile salvare la cache delle funzioni di trasferimento: {e}")